@@ -1,9 +1,15 @@
+from .codec import *
 from .decoder import *
 from .encoder import *
+from .lazy import *
+from .parallel import *
+from .sequence_file import *
 from .stream_decoder import *
 from .types import *
 
-__all__ = sum((decoder.__all__, encoder.__all__, stream_decoder.__all__, types.__all__), ())
+__all__ = sum((codec.__all__, decoder.__all__, encoder.__all__, lazy.__all__,
+               parallel.__all__, sequence_file.__all__, stream_decoder.__all__, types.__all__),
+              ())
 
 version_tuple = (0, 1)
 version_str = f'cborX {".".join(str(part) for part in version_tuple)}'
@@ -0,0 +1,167 @@
+# Copyright (c) 2020, Neil Booth
+#
+# All rights reserved.
+#
+# The MIT License (MIT)
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+# LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+# WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+'''Encoding and decoding of dataclasses, attrs classes and NamedTuples.'''
+
+__all__ = ('codec_for', 'RecordCodec')
+
+
+import dataclasses
+from collections.abc import Mapping
+from functools import partial
+from operator import attrgetter
+
+import attr
+
+from cborx.packing import pack_cbor_length
+from cborx.types import SortMethod, TagError
+
+
+def _single_field(getter, value):
+    return (getter(value), )
+
+
+def _no_fields(value):
+    return ()
+
+
+class RecordCodec:
+    '''Encodes instances of a record class as a map of field names to values, tagged if tag is
+    not None, and decodes such maps back to instances.
+
+    Field names are encoded once.  For each sort method the codec records the encoded map
+    header and keys in encoding order, and an attrgetter loading the field values in that
+    order, so encoding an instance involves no sorting and no encoding of keys.
+
+    Pass codecs to CBOREncoder and CBORDecoder with their codecs option.  Decoding requires a
+    tag; untagged maps can be converted with from_mapping().
+    '''
+
+    def __init__(self, cls, field_names, init_names, tag=None):
+        '''field_names: the fields to encode, in declaration order
+        init_names: maps each field name to its __init__ argument name, or to None if it is
+                    not an __init__ argument
+        '''
+        self.cls = cls
+        self.tag = tag
+        self.field_names = tuple(field_names)
+        self._init_names = init_names
+        # When no names need translating decoded maps are passed straight to cls
+        self._is_simple = all(name == init_name for name, init_name in init_names.items())
+        self._layouts = {}
+
+    def _layout(self, sort_method):
+        layout = self._layouts.get(sort_method)
+        if layout is None:
+            pairs = [(pack_cbor_length(len(name.encode()), 0x60) + name.encode(), name)
+                     for name in self.field_names]
+            if sort_method == SortMethod.LEXICOGRAPHIC:
+                pairs.sort()
+            elif sort_method == SortMethod.LENGTH_FIRST:
+                pairs.sort(key=lambda pair: (len(pair[0]), pair[0]))
+            header = pack_cbor_length(len(pairs), 0xa0)
+            if self.tag is not None:
+                header = pack_cbor_length(self.tag, 0xc0) + header
+            encoded_keys = [encoded_key for encoded_key, _name in pairs]
+            names = [name for _encoded_key, name in pairs]
+            # Getters are picklable so codecs can be passed to worker processes
+            if len(names) > 1:
+                getter = attrgetter(*names)
+            elif names:
+                getter = partial(_single_field, attrgetter(names[0]))
+            else:
+                getter = _no_fields
+            layout = self._layouts[sort_method] = (header, encoded_keys, getter)
+        return layout
+
+    def encode(self, value, encoder):
+        '''Return the encoding of value.'''
+        header, encoded_keys, getter = self._layout(encoder.sort_method)
+        encode_item = encoder.encode_item
+        return header + b''.join([encoded_key + encode_item(field_value) for encoded_key,
+                                  field_value in zip(encoded_keys, getter(value))])
+
+    def write(self, value, encoder):
+        '''Write the encoding of value to the encoder's output buffer.'''
+        header, encoded_keys, getter = self._layout(encoder.sort_method)
+        out = encoder._out
+        write_item = encoder.write_item
+        out += header
+        for encoded_key, field_value in zip(encoded_keys, getter(value)):
+            out += encoded_key
+            write_item(field_value)
+
+    def from_mapping(self, mapping):
+        '''Return an instance of the class constructed from a mapping of field names to
+        values, as decoded from an encoding of one.  Fields that are not __init__ arguments
+        are set after construction.'''
+        if self._is_simple:
+            return self.cls(**mapping)
+        init_names = self._init_names
+        kwargs = {}
+        later = []
+        for name, value in mapping.items():
+            init_name = init_names.get(name, name)
+            if init_name is None:
+                later.append((name, value))
+            else:
+                kwargs[init_name] = value
+        result = self.cls(**kwargs)
+        # object.__setattr__ so that frozen classes can be restored too
+        for name, value in later:
+            object.__setattr__(result, name, value)
+        return result
+
+    def decode(self, decoder, tag_value):
+        '''A tag decoder returning an instance of the class.'''
+        mapping = decoder.decode_item()
+        if not isinstance(mapping, Mapping):
+            raise TagError(f'tag {tag_value} for {self.cls.__name__} must wrap a map, '
+                           f'not {mapping!r}')
+        try:
+            return self.from_mapping(mapping)
+        except TypeError as e:
+            raise TagError(f'invalid {self.cls.__name__} record: {e}') from None
+
+    def __repr__(self):
+        return f'<RecordCodec for {self.cls.__name__} tag={self.tag}>'
+
+
+def codec_for(cls, tag=None):
+    '''Return a RecordCodec for cls, which must be a dataclass, an attrs class or a
+    NamedTuple.  If tag is not None encodings are tagged with it.'''
+    if dataclasses.is_dataclass(cls) and isinstance(cls, type):
+        fields = dataclasses.fields(cls)
+        init_names = {field.name: field.name if field.init else None for field in fields}
+    elif attr.has(cls):
+        fields = attr.fields(cls)
+        # attrs strips leading underscores from __init__ argument names
+        init_names = {field.name: field.name.lstrip('_') if field.init else None
+                      for field in fields}
+    elif isinstance(cls, type) and issubclass(cls, tuple) and hasattr(cls, '_fields'):
+        init_names = {name: name for name in cls._fields}
+    else:
+        raise TypeError(f'{cls} is not a dataclass, attrs class or NamedTuple')
+    return RecordCodec(cls, init_names, init_names, tag)
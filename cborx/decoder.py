@@ -25,7 +25,11 @@
 
 '''CBOR decoding.'''
 
-__all__ = ('load', 'loads', 'load_sequence', 'loads_sequence', 'CBORDecoder', 'DeterministicFlags')
+__all__ = (
+    'load', 'loads', 'load_sequence', 'loads_sequence', 'load_mmap', 'load_sequence_mmap',
+    'loads_path', 'item_extent', 'CBORDecoder', 'CBORBufferDecoder', 'DeterministicFlags',
+    'TypedArrayStyle',
+)
 
 
 import itertools
@@ -39,21 +43,26 @@ from decimal import Decimal
 from enum import IntEnum
 from fractions import Fraction
 from functools import partial
-from io import BytesIO
 from ipaddress import ip_address, ip_network
+import mmap
+from sys import intern
 from uuid import UUID
 
 
-from cborx.packing import pack_cbor_short_float, uint_unpackers, be_float_unpackers
+from cborx.packing import (
+    pack_cbor_short_float, uint_unpackers, be_float_unpackers, uint_unpackers_from,
+    be_float_unpackers_from,
+)
 
 from cborx.types import (
     BadInitialByteError, MisplacedBreakError, BadSimpleError, UnexpectedEOFError,
     UnconsumedDataError, TagError, StringEncodingError, DuplicateKeyError,
     DeterministicError,
-    FrozenDict, FrozenOrderedDict, CBORSimple, CBORTag, BigNum, BigFloat,
+    FrozenDict, FrozenOrderedDict, CBORSimple, CBORTag, BigNum, BigFloat, EmbeddedCBOR,
 )
 from cborx.util import (
     datetime_from_enhanced_RFC3339_text, bjoin, sjoin, typed_array_decoder_hints, raise_error,
+    CodecPool,
 )
 
 
@@ -62,6 +71,7 @@ class DecoderFlags(IntEnum):
     IMMUTABLE = 1
     ORDERED = 2
     RETAIN_BIGNUMS = 4
+    BYTES = 8      # Decode byte strings as bytes even if memoryviews were requested
 
 
 class DeterministicFlags(IntEnum):
@@ -74,7 +84,27 @@ class DeterministicFlags(IntEnum):
     ALL = 0xffff
 
 
+class TypedArrayStyle(IntEnum):
+    '''How to decode RFC 8746 typed arrays.
+
+    ARRAY: as an array.array, copied and byteswapped if not in native byte order
+    MEMORYVIEW: as a memoryview of the input cast to the element type, with no copy, if in
+                native byte order, otherwise as ARRAY
+    NUMPY: as a NumPy array sharing memory with the input, with a non-native dtype if not in
+           native byte order.  Requires NumPy.
+    '''
+    ARRAY = 0
+    MEMORYVIEW = 1
+    NUMPY = 2
+
+
 uint_minima = [24, 1 << 8, 1 << 16, 1 << 32]
+# Byte strings are never this long
+no_views = 1 << 64
+# Longer map keys do not go through the string cache
+max_cached_key_length = 64
+# Views are unhashable if the buffer is writable; they are not used where bytes are needed
+view_blocking_flags = DecoderFlags.IMMUTABLE | DecoderFlags.BYTES
 default_tag_decoders = {
     0: 'decode_datetime_text',
     1: 'decode_timestamp',
@@ -82,6 +112,7 @@ default_tag_decoders = {
     3: 'decode_bignum',
     4: 'decode_decimal',
     5: 'decode_bigfloat',
+    24: 'decode_embedded_cbor',
     28: 'decode_shared',
     29: 'decode_shared_ref',
     30: 'decode_rational',
@@ -110,9 +141,20 @@ class CBORDecoder:
 
     def __init__(self, read, *, retain_bignums=False, tag_decoders=None,
                  string_errors='strict', simple_value=None, on_error=None,
-                 check_eof=True, deterministic=DeterministicFlags.NONE):
-        self._read = read
-        self._major_decoders = (
+                 check_eof=True, deterministic=DeterministicFlags.NONE,
+                 byte_string_type=bytes, min_view_length=256, string_cache_size=0,
+                 max_cached_value_length=0, typed_array_style=TypedArrayStyle.ARRAY,
+                 codecs=()):
+        # Embedded CBOR (tag 24) is decoded on access with the same options
+        self._options = dict(
+            retain_bignums=retain_bignums, tag_decoders=tag_decoders,
+            string_errors=string_errors, simple_value=simple_value, on_error=on_error,
+            check_eof=check_eof, deterministic=deterministic, byte_string_type=byte_string_type,
+            min_view_length=min_view_length, string_cache_size=string_cache_size,
+            max_cached_value_length=max_cached_value_length,
+            typed_array_style=typed_array_style, codecs=codecs,
+        )
+        major_decoders = [
             self.decode_unsigned_int,
             self.decode_negative_int,
             self.decode_byte_string,
@@ -121,20 +163,51 @@ class CBORDecoder:
             self.decode_dict,
             self.decode_tag,
             self.decode_simple
-        )
-        self._pending_id = None
-        self._shared_id = itertools.count()
-        self._shared_ids = {}
-        self._flags = 0
-        if retain_bignums:
-            self._flags |= DecoderFlags.RETAIN_BIGNUMS
-        self._custom_tag_decoders = tag_decoders or {}
+        ]
+        # The string cache maps UTF-8 encodings to interned strings.  It is retained across
+        # resets and emptied when full.
+        self._string_cache = {}
+        self._string_cache_size = string_cache_size
+        if string_cache_size > 0:
+            self._decode_key_text = partial(self.decode_cached_text_string,
+                                            max_length=max_cached_key_length)
+            if max_cached_value_length > 0:
+                major_decoders[3] = partial(self.decode_cached_text_string,
+                                            max_length=max_cached_value_length)
+        else:
+            self._decode_key_text = self.decode_text_string
+        self._major_decoders = tuple(major_decoders)
+        self._initial_flags = DecoderFlags.RETAIN_BIGNUMS if retain_bignums else 0
+        self._custom_tag_decoders = dict(tag_decoders or {})
+        for codec in codecs:
+            if codec.tag is None:
+                raise ValueError(f'{codec!r} has no tag so cannot be decoded')
+            self._custom_tag_decoders[codec.tag] = codec.decode
         self._tag_decoders = {}
         self._simple_value = simple_value or CBORSimple
         self._check_eof = check_eof
         self._deterministic = deterministic
         on_error = on_error or raise_error
         self._decode_text = partial(decode_text, string_errors, on_error)
+        if byte_string_type is memoryview:
+            self._min_view_length = min_view_length
+        elif byte_string_type is bytes:
+            self._min_view_length = no_views
+        else:
+            raise ValueError(f'invalid byte string type {byte_string_type}')
+        self._typed_array_style = TypedArrayStyle(typed_array_style)
+        if self._typed_array_style == TypedArrayStyle.NUMPY:
+            import numpy
+            self._numpy = numpy
+        self.reset(read)
+
+    def reset(self, read=None):
+        '''Forget the state of previous decodings, retaining caches, and decode from read.'''
+        self._read = read
+        self._pending_id = None
+        self._shared_id = itertools.count()
+        self._shared_ids = {}
+        self._flags = self._initial_flags
 
     @contextmanager
     def flags_set(self, mask):
@@ -166,17 +239,20 @@ class CBORDecoder:
             kind = minor - 24
             length, = uint_unpackers[kind](self.read(1 << kind))
             if self._deterministic & DeterministicFlags.LENGTH and length < uint_minima[kind]:
-                if initial_byte < 0x20:
-                    raise DeterministicError(f'value {length:,d} is not minimally encoded')
-                elif initial_byte < 0x40:
-                    raise DeterministicError(f'value {-1 - length:,d} is not minimally encoded')
-                else:
-                    raise DeterministicError(f'length {length:,d} is not minimally encoded')
+                self._non_minimal_length(initial_byte, length)
             return length
         if initial_byte in {0x5f, 0x7f, 0x9f, 0xbf}:
             return -1
         raise BadInitialByteError(f'bad initial byte 0x{initial_byte:x}')
 
+    def _non_minimal_length(self, initial_byte, length):
+        if initial_byte < 0x20:
+            raise DeterministicError(f'value {length:,d} is not minimally encoded')
+        elif initial_byte < 0x40:
+            raise DeterministicError(f'value {-1 - length:,d} is not minimally encoded')
+        else:
+            raise DeterministicError(f'length {length:,d} is not minimally encoded')
+
     def decode_unsigned_int(self, initial_byte):
         return self.decode_length(initial_byte)
 
@@ -200,6 +276,8 @@ class CBORDecoder:
             if self._deterministic & DeterministicFlags.REALIZE_IL:
                 raise DeterministicError(f'indeterminate-length byte string')
             return bjoin(self._byte_string_parts())
+        if length >= self._min_view_length and not self._flags & view_blocking_flags:
+            return self.read_view(length)
         return self.read(length)
 
     def _text_string_parts(self):
@@ -216,11 +294,31 @@ class CBORDecoder:
     def decode_text_string(self, initial_byte):
         length = self.decode_length(initial_byte)
         if length == -1:
-            if self._deterministic & DeterministicFlags.REALIZE_IL:
-                raise DeterministicError(f'indeterminate-length text string')
-            return sjoin(self._text_string_parts())
+            return self._il_text_string()
         return self._decode_text(self.read(length))
 
+    def decode_cached_text_string(self, initial_byte, max_length):
+        '''Decode a text string, returning an interned string from the string cache if it is
+        no more than max_length bytes long.'''
+        length = self.decode_length(initial_byte)
+        if length == -1:
+            return self._il_text_string()
+        raw_utf8 = self.read(length)
+        if length > max_length:
+            return self._decode_text(raw_utf8)
+        cache = self._string_cache
+        result = cache.get(raw_utf8)
+        if result is None:
+            if len(cache) >= self._string_cache_size:
+                cache.clear()
+            result = cache[raw_utf8] = intern(self._decode_text(raw_utf8))
+        return result
+
+    def _il_text_string(self):
+        if self._deterministic & DeterministicFlags.REALIZE_IL:
+            raise DeterministicError(f'indeterminate-length text string')
+        return sjoin(self._text_string_parts())
+
     def _list_parts(self):
         read = self.read
         decode_item = self.decode_item
@@ -244,12 +342,16 @@ class CBORDecoder:
         read = self.read
         keys_append = keys.append
         decode_item = self.decode_item
+        decode_key_text = self._decode_key_text
         while length:
             initial_byte = ord(read(1))
             if initial_byte == 0xff and length < 0:
                 break
-            with self.flags_set(DecoderFlags.IMMUTABLE):
-                key = decode_item(initial_byte)
+            if 0x60 <= initial_byte < 0x7c:
+                key = decode_key_text(initial_byte)
+            else:
+                with self.flags_set(DecoderFlags.IMMUTABLE):
+                    key = decode_item(initial_byte)
             keys_append(key)
             yield key, decode_item()
             length -= 1
@@ -329,7 +431,8 @@ class CBORDecoder:
         return datetime.fromtimestamp(timestamp, timezone.utc)
 
     def decode_bignum(self, tag_value):
-        bignum_encoding = self.decode_item()
+        with self.flags_set(DecoderFlags.BYTES):
+            bignum_encoding = self.decode_item()
         if not isinstance(bignum_encoding, bytes):
             raise TagError(f'bignum must be a byte string, not {bignum_encoding!r}')
         value = int.from_bytes(bignum_encoding, byteorder='big')
@@ -362,6 +465,13 @@ class CBORDecoder:
         mantissa, exponent = self._decode_mantissa_exponent('bigfloat')
         return BigFloat(mantissa, exponent)
 
+    def decode_embedded_cbor(self, _tag_value):
+        with self.flags_set(DecoderFlags.BYTES):
+            encoding = self.decode_item()
+        if not isinstance(encoding, bytes):
+            raise TagError(f'embedded CBOR must be encoded as a byte string, not {encoding!r}')
+        return EmbeddedCBOR(encoding, options=self._options)
+
     def decode_rational(self, _tag_value):
         parts = self.decode_item()
         if (not isinstance(parts, Sequence) or
@@ -373,14 +483,39 @@ class CBORDecoder:
         return Fraction(numerator, denominator)
 
     def decode_typed_array(self, tag_value):
-        array_bytes = self.decode_item()
-        if not isinstance(array_bytes, bytes):
-            raise TagError(f'a typed array must be encoded as a byte string')
         typecode, swap_bytes = typed_array_decoder_hints[tag_value]
-        result = array(typecode, array_bytes)
+        style = self._typed_array_style
+        if style == TypedArrayStyle.ARRAY or (swap_bytes and style == TypedArrayStyle.MEMORYVIEW):
+            with self.flags_set(DecoderFlags.BYTES):
+                array_bytes = self.decode_item()
+            if not isinstance(array_bytes, bytes):
+                raise TagError(f'a typed array must be encoded as a byte string')
+            result = array(typecode, array_bytes)
+            if swap_bytes:
+                result.byteswap()
+            return result
+
+        array_view = self._byte_string_view()
+        if style == TypedArrayStyle.MEMORYVIEW:
+            if len(array_view) % array(typecode).itemsize:
+                raise ValueError('bytes length not a multiple of item size')
+            return array_view.cast(typecode)
+        dtype = self._numpy.dtype(typecode)
         if swap_bytes:
-            result.byteswap()
-        return result
+            dtype = dtype.newbyteorder()
+        return self._numpy.frombuffer(array_view, dtype)
+
+    def _byte_string_view(self):
+        '''Decode a byte string as a memoryview.  A definite-length string is not copied if the
+        input is held in memory.'''
+        initial_byte = ord(self.read(1))
+        if 0x40 <= initial_byte < 0x5c:
+            return self.read_view(self.decode_length(initial_byte))
+        with self.flags_set(DecoderFlags.BYTES):
+            array_bytes = self.decode_item(initial_byte)
+        if not isinstance(array_bytes, bytes):
+            raise TagError(f'a typed array must be encoded as a byte string')
+        return memoryview(array_bytes)
 
     def decode_regexp(self, _tag_value):
         pattern = self.decode_item()
@@ -389,7 +524,8 @@ class CBORDecoder:
         return re.compile(pattern)
 
     def decode_uuid(self, _tag_value):
-        uuid = self.decode_item()
+        with self.flags_set(DecoderFlags.BYTES):
+            uuid = self.decode_item()
         if not isinstance(uuid, bytes):
             raise TagError(f'a UUID must be encoded as a byte string, not {uuid!r}')
         return UUID(bytes=uuid)
@@ -403,7 +539,8 @@ class CBORDecoder:
         return cls(members)
 
     def decode_ip_address(self, _tag_value):
-        addr_bytes = self.decode_item()
+        with self.flags_set(DecoderFlags.BYTES):
+            addr_bytes = self.decode_item()
         if not isinstance(addr_bytes, bytes):
             raise TagError('an IP address must be encoded as a byte string')
         try:
@@ -457,6 +594,9 @@ class CBORDecoder:
             return result
         raise UnexpectedEOFError(f'need {n:,d} bytes but only {len(result):,d} available')
 
+    def read_view(self, n):
+        return memoryview(self.read(n))
+
     def decode_item(self, initial_byte=None):
         if initial_byte is None:
             initial_byte = ord(self.read(1))
@@ -480,13 +620,341 @@ class CBORDecoder:
             yield decode_item(initial_byte)
 
 
+class CBORBufferDecoder(CBORDecoder):
+    '''Decodes CBOR-encoded data held in memory.
+
+    Rather than pulling each token through read(), the decoder indexes the buffer directly
+    with an integer cursor and unpacks arguments in place.  raw can be any object supporting
+    the buffer protocol, such as bytes, bytearray, memoryview or mmap.
+    '''
+
+    def __init__(self, raw, **kwargs):
+        super().__init__(raw, **kwargs)
+
+    def reset(self, raw=b''):
+        '''Forget the state of previous decodings, retaining caches, and decode from raw.'''
+        super().reset()
+        # Slicing bytes or an mmap gives bytes; anything else is accessed through a view
+        if not isinstance(raw, (bytes, mmap.mmap)):
+            raw = memoryview(raw).cast('B')
+        self._buf = raw
+        self._view = None
+        self._pos = 0
+        self._end = len(raw)
+
+    def _eof_error(self, n):
+        return UnexpectedEOFError(f'need {n:,d} bytes but only '
+                                  f'{self._end - self._pos:,d} available')
+
+    def read(self, n):
+        pos = self._pos
+        end = pos + n
+        if end > self._end:
+            raise self._eof_error(n)
+        self._pos = end
+        result = self._buf[pos:end]
+        if result.__class__ is memoryview:
+            return result.tobytes()
+        return result
+
+    def read_view(self, n):
+        '''Return a memoryview of the next n bytes.  It keeps the buffer alive.'''
+        pos = self._pos
+        self.skip(n)
+        if self._view is None:
+            self._view = memoryview(self._buf).cast('B')
+        return self._view[pos:pos + n]
+
+    def read_byte(self):
+        pos = self._pos
+        if pos >= self._end:
+            raise self._eof_error(1)
+        self._pos = pos + 1
+        return self._buf[pos]
+
+    def skip(self, n):
+        '''Advance past n bytes.'''
+        end = self._pos + n
+        if end > self._end:
+            raise self._eof_error(n)
+        self._pos = end
+
+    def skip_item(self):
+        '''Advance past the next item without decoding it.  Definite-length strings are
+        skipped in constant time and containers are walked by their headers alone.'''
+        read_byte = self.read_byte
+        decode_length = self.decode_length
+        skip = self.skip
+        # Items remaining in the current container.  Indefinite-length containers are -1
+        # for an array, and -2 or -3 for a map expecting a key or a value respectively.
+        remaining = 1
+        stack = []
+        while True:
+            if not remaining:
+                if not stack:
+                    return
+                remaining = stack.pop()
+                continue
+            initial_byte = read_byte()
+            if initial_byte == 0xff:
+                if remaining > -1 or remaining == -3:
+                    raise MisplacedBreakError('break code outside indefinite-length object')
+                remaining = 0
+                continue
+            if remaining > 0:
+                remaining -= 1
+            elif remaining < -1:
+                remaining = -3 if remaining == -2 else -2
+            major = initial_byte >> 5
+            if major < 2:
+                decode_length(initial_byte)
+            elif major < 4:
+                length = decode_length(initial_byte)
+                if length == -1:
+                    self._skip_string_parts(major)
+                else:
+                    skip(length)
+            elif major < 6:
+                length = decode_length(initial_byte)
+                stack.append(remaining)
+                if length == -1:
+                    remaining = -1 if major == 4 else -2
+                else:
+                    remaining = length if major == 4 else length * 2
+            elif major == 6:
+                decode_length(initial_byte)
+                stack.append(remaining)
+                remaining = 1
+            else:
+                minor = initial_byte & 0x1f
+                if minor == 24:
+                    value = read_byte()
+                    if value < 32:
+                        raise BadSimpleError(f'simple value 0x{value:x} encoded with extra byte')
+                elif minor > 24:
+                    if minor > 27:
+                        raise BadInitialByteError(f'bad initial byte 0x{initial_byte:x}')
+                    skip(1 << (minor - 24))
+
+    def item_extent(self):
+        '''Advance past the next item without decoding it, and return its (start, end) byte
+        offsets in the buffer.'''
+        start = self._pos
+        self.skip_item()
+        return start, self._pos
+
+    def _array_index(self, length, index):
+        '''Advance to the item of an array at the given index.'''
+        if not isinstance(index, int):
+            raise TypeError(f'array indices must be integers, not {index!r}')
+        if length == -1:
+            start = self._pos
+            length = 0
+            while self.read_byte() != 0xff:
+                self._pos -= 1
+                self.skip_item()
+                length += 1
+            self._pos = start
+        if index < 0:
+            index += length
+        if not 0 <= index < length:
+            raise IndexError(f'array index {index} out of range')
+        for _ in range(index):
+            self.skip_item()
+
+    def _map_value(self, length, key):
+        '''Advance to the value of a map with the given key.'''
+        read_byte = self.read_byte
+        skip_item = self.skip_item
+        decode_item = self.decode_item
+        while length:
+            initial_byte = read_byte()
+            if initial_byte == 0xff and length < 0:
+                break
+            with self.flags_set(DecoderFlags.IMMUTABLE):
+                item_key = decode_item(initial_byte)
+            if item_key == key:
+                return
+            skip_item()
+            length -= 1
+        raise KeyError(key)
+
+    def find_path(self, path):
+        '''Follow path, a sequence of array indices and map keys, from the next item through
+        nested arrays and maps, skipping tags.  Return the (start, end) byte offsets of the
+        item it leads to.  Only the map keys along the path are decoded.'''
+        for step in path:
+            initial_byte = self.read_byte()
+            while initial_byte >> 5 == 6:
+                self.decode_length(initial_byte)
+                initial_byte = self.read_byte()
+            major = initial_byte >> 5
+            if major == 4:
+                self._array_index(self.decode_length(initial_byte), step)
+            elif major == 5:
+                self._map_value(self.decode_length(initial_byte), step)
+            else:
+                raise TypeError(f'cannot look up {step!r} in an item with initial byte '
+                                f'0x{initial_byte:x}')
+        return self.item_extent()
+
+    def _skip_string_parts(self, major):
+        kind = 'byte' if major == 2 else 'text'
+        while True:
+            initial_byte = self.read_byte()
+            if initial_byte == 0xff:
+                break
+            if initial_byte >> 5 != major or initial_byte & 0x1f > 27:
+                raise BadInitialByteError(f'bad initial byte 0x{initial_byte:x} in '
+                                          f'indefinite-length {kind} string')
+            self.skip(self.decode_length(initial_byte))
+
+    def decode_length(self, initial_byte):
+        minor = initial_byte & 0x1f
+        if minor < 24:
+            return minor
+        if minor < 28:
+            kind = minor - 24
+            pos = self._pos
+            end = pos + (1 << kind)
+            if end > self._end:
+                raise self._eof_error(1 << kind)
+            length, = uint_unpackers_from[kind](self._buf, pos)
+            self._pos = end
+            if self._deterministic & DeterministicFlags.LENGTH and length < uint_minima[kind]:
+                self._non_minimal_length(initial_byte, length)
+            return length
+        if initial_byte in {0x5f, 0x7f, 0x9f, 0xbf}:
+            return -1
+        raise BadInitialByteError(f'bad initial byte 0x{initial_byte:x}')
+
+    def decode_simple(self, initial_byte):
+        # Floats are unpacked in place; everything else is rare enough to share the base code
+        value = initial_byte & 0x1f
+        if not 24 < value < 28:
+            return super().decode_simple(initial_byte)
+        pos = self._pos
+        length = 1 << (value - 24)
+        end = pos + length
+        if end > self._end:
+            raise self._eof_error(length)
+        float_value, = be_float_unpackers_from[value - 25](self._buf, pos)
+        self._pos = end
+        if value > 25 and self._deterministic & DeterministicFlags.FLOAT:
+            if length != len(pack_cbor_short_float(float_value)) - 1:
+                raise DeterministicError(f'float {float_value} is not minimally encoded')
+        return float_value
+
+    def _list_parts(self):
+        read_byte = self.read_byte
+        decode_item = self.decode_item
+        while True:
+            initial_byte = read_byte()
+            if initial_byte == 0xff:
+                break
+            yield decode_item(initial_byte)
+
+    def decode_list(self, initial_byte):
+        # Definite-length arrays of ints 0 to 23 are decoded in bulk
+        if 0x88 <= initial_byte < 0x9c:
+            pos = self._pos
+            length = self.decode_length(initial_byte)
+            items_pos = self._pos
+            if length and items_pos < self._end and self._buf[items_pos] < 0x18:
+                items = self._buf[items_pos:items_pos + length]
+                if len(items) == length and max(items) < 0x18:
+                    self._pos = items_pos + length
+                    if self._flags & DecoderFlags.IMMUTABLE:
+                        return tuple(items)
+                    return self._build_mutable(list)(items)
+            self._pos = pos
+        return super().decode_list(initial_byte)
+
+    def _key_value_pairs(self, keys, length):
+        read_byte = self.read_byte
+        keys_append = keys.append
+        decode_item = self.decode_item
+        decode_key_text = self._decode_key_text
+        while length:
+            initial_byte = read_byte()
+            if initial_byte == 0xff and length < 0:
+                break
+            if 0x60 <= initial_byte < 0x7c:
+                # Text keys are common and need no flags
+                key = decode_key_text(initial_byte)
+            else:
+                flags = self._flags
+                self._flags = flags | DecoderFlags.IMMUTABLE
+                key = decode_item(initial_byte)
+                self._flags = flags
+            keys_append(key)
+            yield key, decode_item()
+            length -= 1
+
+    def decode_item(self, initial_byte=None):
+        if initial_byte is None:
+            pos = self._pos
+            if pos >= self._end:
+                raise self._eof_error(1)
+            initial_byte = self._buf[pos]
+            self._pos = pos + 1
+        return self._major_decoders[initial_byte >> 5](initial_byte)
+
+    def decode(self):
+        result = self.decode_item()
+        if self._check_eof and self._pos != self._end:
+            raise UnconsumedDataError('not all input consumed')
+        return result
+
+    def decode_sequence(self):
+        '''Decode a sequence of top-level CBOR items.  Acts as a generator yielding the values.'''
+        decode_item = self.decode_item
+        while self._pos < self._end:
+            yield decode_item()
+
+
+decoder_pool = CodecPool(CBORDecoder)
+buffer_decoder_pool = CodecPool(CBORBufferDecoder)
+
+
 def loads(raw, **kwargs):
     '''Deserialize a raw binary (e.g. bytes) object containing a CBOR document to a Python
     object.
 
     kwargs: arguments to pass to CBORDecoder
     '''
-    return load(BytesIO(raw), **kwargs)
+    key, decoder = buffer_decoder_pool.acquire((raw, ), kwargs)
+    try:
+        return decoder.decode()
+    finally:
+        buffer_decoder_pool.release(key, decoder)
+
+
+def loads_path(raw, path, *, as_memoryview=False, **kwargs):
+    '''Decode only the item at path in a raw binary (e.g. bytes) object containing a CBOR
+    document, without decoding the rest of the document.
+
+    path: a sequence of array indices and map keys, e.g. ('records', 17, 'payload')
+    as_memoryview: if True return a memoryview of the item's encoding instead of decoding it
+    kwargs: arguments to pass to CBORDecoder
+    '''
+    key, decoder = buffer_decoder_pool.acquire((raw, ), kwargs)
+    try:
+        start, end = decoder.find_path(path)
+        if as_memoryview:
+            return memoryview(raw).cast('B')[start:end]
+        decoder._pos = start
+        return decoder.decode_item()
+    finally:
+        buffer_decoder_pool.release(key, decoder)
+
+
+def item_extent(raw, offset=0):
+    '''Return the (start, end) byte offsets of the CBOR item at offset in a raw binary (e.g.
+    bytes) object, without decoding it.'''
+    decoder = CBORBufferDecoder(raw)
+    decoder._pos = offset
+    return decoder.item_extent()
 
 
 def load(fp, **kwargs):
@@ -495,7 +963,11 @@ def load(fp, **kwargs):
     fp: an object with a read() method, such as a file or socket
     kwargs: arguments to pass to CBORDecoder
     '''
-    return CBORDecoder(fp.read, **kwargs).decode()
+    key, decoder = decoder_pool.acquire((fp.read, ), kwargs)
+    try:
+        return decoder.decode()
+    finally:
+        decoder_pool.release(key, decoder)
 
 
 def loads_sequence(raw, **kwargs):
@@ -504,7 +976,11 @@ def loads_sequence(raw, **kwargs):
 
     kwargs: arguments to pass to CBORDecoder
     '''
-    yield from load_sequence(BytesIO(raw), **kwargs)
+    key, decoder = buffer_decoder_pool.acquire((raw, ), kwargs)
+    try:
+        yield from decoder.decode_sequence()
+    finally:
+        buffer_decoder_pool.release(key, decoder)
 
 
 def load_sequence(fp, **kwargs):
@@ -513,4 +989,52 @@ def load_sequence(fp, **kwargs):
     fp: an object with a read() method, such as a file or socket
     kwargs: arguments to pass to CBORDecoder
     '''
-    yield from CBORDecoder(fp.read, **kwargs).decode_sequence()
+    key, decoder = decoder_pool.acquire((fp.read, ), kwargs)
+    try:
+        yield from decoder.decode_sequence()
+    finally:
+        decoder_pool.release(key, decoder)
+
+
+@contextmanager
+def mapped_file(path, sequential=False):
+    '''A context manager that maps the file at path read-only.  The mapping is closed on exit
+    unless memoryviews of it are still alive, in which case it is unmapped when the last of
+    them is released.'''
+    with open(path, 'rb') as f:
+        try:
+            mapping = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # Empty files cannot be mapped
+            yield b''
+            return
+    if sequential and hasattr(mapping, 'madvise'):
+        mapping.madvise(mmap.MADV_SEQUENTIAL)
+    try:
+        yield mapping
+    finally:
+        try:
+            mapping.close()
+        except BufferError:
+            pass
+
+
+def load_mmap(path, **kwargs):
+    '''Deserialize a CBOR document in the file at path to a Python object.  The file is
+    memory-mapped and decoded in place rather than read.  Pass byte_string_type=memoryview
+    to have long byte strings returned as views of the mapping.
+
+    kwargs: arguments to pass to CBORDecoder
+    '''
+    with mapped_file(path) as mapping:
+        return loads(mapping, **kwargs)
+
+
+def load_sequence_mmap(path, **kwargs):
+    '''Yield a sequence of python objects from the file at path containing a sequence of CBOR
+    documents.  The file is memory-mapped and decoded in place rather than read.
+
+    kwargs: arguments to pass to CBORDecoder
+    '''
+    with mapped_file(path, sequential=True) as mapping:
+        yield from loads_sequence(mapping, **kwargs)
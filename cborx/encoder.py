@@ -25,33 +25,75 @@
 
 '''CBOR encoding.'''
 
+import io
 import itertools
+import os
 import re
+import socket
 from array import array
 from collections import OrderedDict
 from datetime import datetime, date
 from decimal import Decimal
 from enum import IntEnum
 from fractions import Fraction
-from functools import partial
+from functools import partial, lru_cache
+from operator import itemgetter
 from ipaddress import IPv4Address, IPv6Address, IPv4Network, IPv6Network
 from uuid import UUID
 
-from cborx.packing import pack_cbor_length, pack_cbor_short_float, pack_cbor_double
-from cborx.types import FrozenDict, FrozenOrderedDict, EncodingError, SortMethod
-from cborx.util import uint_to_be_bytes, bjoin, sjoin, typecode_to_tag_map
+try:
+    from ssl import SSLSocket
+except ImportError:
+    SSLSocket = ()
+
+from cborx.packing import (
+    pack_cbor_length, pack_cbor_short_float, pack_cbor_double, write_cbor_length,
+    pack_cbor_short_floats, pack_cbor_doubles, cbor_length_size,
+)
+from cborx.types import (
+    FrozenDict, FrozenOrderedDict, RawCBOR, CBORTag, EncodingError, SortMethod,
+)
+from cborx.util import (
+    uint_to_be_bytes, bjoin, sjoin, typecode_to_tag_map, buffer_format_to_tag, CodecPool,
+)
 
 
 __all__ = (
-    'dump', 'dumps', 'CBOREncoder', 'CBORDateTimeStyle', 'CBORFloatStyle',
+    'adump', 'AsyncSequenceWriter', 'dump', 'dumps', 'CBOREncoder', 'CBORDateTimeStyle',
+    'CBORFloatStyle', 'RecordTemplate',
 )
 
 
 # TODO:
 #
 # - encoder customization
-# - embedded CBOR data item
-# - streaming API
+
+
+# The default number of bytes buffered before output is flushed when streaming
+DEFAULT_CHUNK_SIZE = 65536
+# The default number of bytes written to an asyncio stream between waits for it to drain
+DEFAULT_HIGH_WATER = 1 << 18
+# Byte strings at least this long are referenced rather than copied when writing segments
+DEFAULT_MIN_SEGMENT_LENGTH = 8192
+# Byte strings are never this long
+NO_SEGMENTS = 1 << 64
+# The most buffers passed to a single os.writev() or sendmsg() call
+MAX_IOVECS = 1024
+# Shorter lists are not worth checking for homogeneous ints or floats
+BULK_MIN_LENGTH = 8
+# Bounds on the record templates an encoder creates automatically
+MAX_TEMPLATE_KEYS = 32
+MAX_TEMPLATES = 256
+# Key types whose encoding depends only on their type and value.  Floats are excluded as
+# 0.0 == -0.0 but their encodings differ.
+TEMPLATE_KEY_TYPES = frozenset((str, int, bytes, bool, type(None)))
+# Containers nested deeper than this are checked for cycles by the iterative engine
+CYCLE_CHECK_DEPTH = 100
+# Immutable containers whose encodings can be memoized, and the types of their members
+MEMO_TYPES = frozenset((tuple, frozenset, FrozenDict, FrozenOrderedDict))
+MEMO_SCALAR_TYPES = TEMPLATE_KEY_TYPES.union((float, ))
+# Types whose equal values have the same encoding
+EXACT_TYPES = frozenset((str, int, bytes, type(None)))
 
 
 class CBORDateTimeStyle(IntEnum):
@@ -69,8 +111,9 @@ class CBORFloatStyle(IntEnum):
 
 def sorted_pairs(pairs_gen, method):
     '''Return an iterable sorting the pairs according to method.'''
+    # Only the encoded keys are compared
     if method == SortMethod.LEXICOGRAPHIC:
-        return sorted(pairs_gen)
+        return sorted(pairs_gen, key=itemgetter(0))
     elif method == SortMethod.LENGTH_FIRST:
         return sorted(pairs_gen, key=lambda pair: (len(pair[0]), pair[0]))
     else:
@@ -87,13 +130,114 @@ def sorted_items(encoded_items_gen, method):
         return list(encoded_items_gen)
 
 
+@lru_cache(maxsize=None)
+def overridden_encode_methods(cls):
+    '''Return the names of the encoding methods of cls, a CBOREncoder subclass, that
+    override those of CBOREncoder.  Writers, sizers and walkers bypass the encoding methods,
+    so they are not used for these.'''
+    return frozenset(name for name in dir(CBOREncoder) if name.startswith('encode_')
+                     and getattr(cls, name) is not getattr(CBOREncoder, name))
+
+
+def deeply_immutable(value):
+    '''Return True if value is a scalar or a memoizable container of such values.'''
+    vtype = value.__class__
+    if vtype in MEMO_SCALAR_TYPES:
+        return True
+    if vtype is tuple or vtype is frozenset:
+        return all(map(deeply_immutable, value))
+    if vtype is FrozenDict or vtype is FrozenOrderedDict:
+        return all(map(deeply_immutable, value)) and all(map(deeply_immutable, value.values()))
+    return False
+
+
+def same_encoding(value, other):
+    '''Return True if two deeply-immutable values that compare equal certainly have the same
+    encoding.  Equality is too loose: 1 == 1.0 == True and 0.0 == -0.0.'''
+    vtype = value.__class__
+    if vtype is not other.__class__:
+        return False
+    if vtype in EXACT_TYPES or vtype is bool:
+        return True
+    if vtype is float:
+        return pack_cbor_double(value) == pack_cbor_double(other)
+    if vtype is tuple:
+        return all(map(same_encoding, value, other))
+    if vtype is frozenset:
+        # Then each member of one equals a member of the other of the same type
+        return all(member.__class__ in EXACT_TYPES for member in itertools.chain(value, other))
+    # Dicts in the same order; those in different orders may differ if unsorted
+    return (all(map(same_encoding, value, other))
+            and all(map(same_encoding, value.values(), other.values())))
+
+
+class RecordTemplate:
+    '''Encodes mappings that have exactly the given keys.
+
+    The map header and the encoded keys, in the order sort_method places them, are computed
+    once, so encoding a mapping encodes only its values.  Encoders automatically use templates
+    for dicts with scalar keys.
+
+    encoder: encodes keys other than strings; by default a CBOREncoder with default options
+    '''
+
+    def __init__(self, keys, sort_method=SortMethod.LEXICOGRAPHIC, encoder=None):
+        encode_key = encoder.encode_item if encoder else None
+        pairs = []
+        for key in keys:
+            if key.__class__ is str:
+                key_utf8 = key.encode()
+                pairs.append((pack_cbor_length(len(key_utf8), 0x60) + key_utf8, key))
+            else:
+                encode_key = encode_key or CBOREncoder().encode_item
+                pairs.append((encode_key(key), key))
+        if len(set(key for _encoded_key, key in pairs)) != len(pairs):
+            raise ValueError('record template keys must be distinct')
+        pairs = list(sorted_pairs(pairs, sort_method))
+        self.keys = tuple(key for _encoded_key, key in pairs)
+        self.header = pack_cbor_length(len(pairs), 0xa0)
+        self.encoded_keys = tuple(encoded_key for encoded_key, _key in pairs)
+        # The size of the encoding less the values
+        self.keys_size = len(self.header) + sum(map(len, self.encoded_keys))
+        if len(pairs) > 1:
+            self._getter = itemgetter(*self.keys)
+        elif pairs:
+            getter = itemgetter(self.keys[0])
+            self._getter = lambda mapping: (getter(mapping), )
+        else:
+            self._getter = lambda mapping: ()
+
+    def values(self, mapping):
+        '''Return the values of mapping in encoding order.'''
+        if len(mapping) != len(self.keys):
+            raise ValueError(f'mapping has {len(mapping):,d} keys but the record template '
+                             f'has {len(self.keys):,d}')
+        return self._getter(mapping)
+
+    def encode(self, mapping, encoder):
+        '''Return the encoding of mapping using encoder to encode its values.'''
+        encode_item = encoder.encode_item
+        return self.header + b''.join([encoded_key + encode_item(value) for encoded_key, value
+                                       in zip(self.encoded_keys, self.values(mapping))])
+
+    def write(self, mapping, encoder):
+        '''Write the encoding of mapping to the encoder's output buffer.'''
+        out = encoder._out
+        write_item = encoder.write_item
+        out += self.header
+        for encoded_key, value in zip(self.encoded_keys, self.values(mapping)):
+            out += encoded_key
+            write_item(value)
+
+
 class CBOREncoder:
 
     SHARED_TYPES = {tuple, list, dict, OrderedDict}
 
     def __init__(self, *, tzinfo=None, datetime_style=CBORDateTimeStyle.TIMESTAMP,
                  float_style=CBORFloatStyle.SHORTEST, sort_method=SortMethod.LEXICOGRAPHIC,
-                 realize_il=True, shared_types=(), deterministic=False):
+                 realize_il=True, shared_types=(), deterministic=False, key_cache_size=0,
+                 codecs=(), memo_cache_bytes=0, iterative=False):
         if deterministic:
             if sort_method == SortMethod.UNSORTED:
                 raise ValueError('a deterministic encoder requires sorting')
@@ -105,10 +249,58 @@ class CBOREncoder:
         self.sort_method = sort_method
         self.realize_il = realize_il
         self.shared_types = shared_types
+        # Unlimited nesting depth at a speed cost; see encode()
+        self.iterative = iterative
         # Implementation details
         self._encode_funcs = {}
+        self._write_funcs = {}
+        self._size_funcs = {}
+        self._walk_funcs = {}
+        # The writers of types walked whole, and the buffer size at which walking yields
+        self._leaf_funcs = {}
+        self._chunk_size = NO_SEGMENTS
+        self._codecs = {codec.cls: codec for codec in codecs}
+        # Pairs (key_types, template) keyed by the keys of a dict in iteration order.
+        # key_types is None if all keys are strings.
+        self._templates = {}
+        self._overrides = overridden_encode_methods(self.__class__)
+        self._template_key_types = frozenset(
+            key_type for key_type in TEMPLATE_KEY_TYPES.difference(shared_types)
+            if default_encode_funcs[key_type] not in self._overrides)
+        # Types lists of which are written in bulk
+        self._bulk_types = frozenset(
+            vtype for vtype in (int, float)
+            if vtype not in shared_types and default_encode_funcs[vtype] not in self._overrides)
+        if key_cache_size > 0:
+            # An LRU cache of the encodings of map keys.  Shared types are not cached.
+            self._cached_key_types = frozenset((str, int, bytes)).difference(shared_types)
+            self._key_cache = lru_cache(maxsize=key_cache_size, typed=True)(self.encode_item)
+            self._encode_key = self._encode_cached_key
+            self._write_key = self._write_cached_key
+        else:
+            self._encode_key = self.encode_item
+            self._write_key = self.write_item
+        # An LRU cache mapping immutable containers to (value, encoding) pairs, holding at
+        # most memo_cache_bytes of encodings.  Shared references depend on encoding order so
+        # it is not used with shared types.
+        if memo_cache_bytes > 0 and not shared_types:
+            self._memo = OrderedDict()
+        else:
+            self._memo = None
+        self._memo_cache_bytes = memo_cache_bytes
+        self._memo_bytes = 0
+        self.reset()
+
+    def reset(self):
+        '''Forget the state of previous encodings, retaining caches, so the encoder can be
+        reused.'''
+        self._out = bytearray()
         self._shared_id = itertools.count()
         self._shared_ids = {}
+        # When writing segments, large byte strings are added to _segments after the output
+        # buffered before them
+        self._segments = None
+        self._min_segment_length = NO_SEGMENTS
 
     def _encode_shared(self, encode_func, value):
         value_id = id(value)
@@ -119,10 +311,38 @@ class CBOREncoder:
         else:
             return self.encode_tag(29) + self.encode_int(value_ref)
 
+    def _encode_memoized(self, encode_func, value):
+        '''Return the encoding of an immutable container from the memo cache, encoding and
+        caching it if necessary.'''
+        memo = self._memo
+        try:
+            entry = memo.get(value)
+        except TypeError:
+            # Unhashable members, so not immutable
+            return encode_func(value)
+        if entry is not None and (entry[0] is value or same_encoding(entry[0], value)):
+            memo.move_to_end(value)
+            return entry[1]
+        encoding = encode_func(value)
+        if len(encoding) <= self._memo_cache_bytes and deeply_immutable(value):
+            # Encoding the members may have evicted the entry
+            entry = memo.pop(value, None)
+            if entry is not None:
+                self._memo_bytes -= len(entry[1])
+            memo[value] = (value, encoding)
+            self._memo_bytes += len(encoding)
+            while self._memo_bytes > self._memo_cache_bytes:
+                _value, evicted = memo.popitem(last=False)[1]
+                self._memo_bytes -= len(evicted)
+        return encoding
+
     def _encode_func(self, vtype):
         used_type = vtype
         func_text = default_encode_funcs.get(vtype)
-        if func_text:
+        codec = self._codecs.get(vtype)
+        if codec:
+            encode_func = partial(codec.encode, encoder=self)
+        elif func_text:
             encode_func = getattr(self, func_text)
         else:
             encode_func = getattr(vtype, '__encode_cbor__', None)
@@ -136,7 +356,10 @@ class CBOREncoder:
                         encode_func = getattr(self, func_text)
                         break
                 else:
-                    raise EncodingError(f'do not know how to encode object of type {vtype}')
+                    # Perhaps it supports the buffer protocol, like a NumPy array
+                    encode_func = self.encode_buffer_object
+        if self._memo is not None and vtype in MEMO_TYPES and not codec:
+            encode_func = partial(self._encode_memoized, encode_func)
         if used_type in self.shared_types:
             encode_func = partial(self._encode_shared, encode_func)
         self._encode_funcs[vtype] = encode_func
@@ -184,14 +407,54 @@ class CBOREncoder:
         encoded_items_gen = (encode_item(item) for item in value)
         return length + bjoin(sorted_items(encoded_items_gen, self.sort_method))
 
+    def _encode_cached_key(self, key):
+        if key.__class__ in self._cached_key_types:
+            return self._key_cache(key)
+        return self.encode_item(key)
+
+    def _write_cached_key(self, key):
+        if key.__class__ in self._cached_key_types:
+            self._out += self._key_cache(key)
+        else:
+            self.write_item(key)
+
     def encode_sorted_dict(self, kv_pairs, sort_method):
         encode_item = self.encode_item
-        pairs_gen = ((encode_item(key), value) for key, value in kv_pairs)
+        encode_key = self._encode_key
+        pairs_gen = ((encode_key(key), value) for key, value in kv_pairs)
         length = pack_cbor_length(len(kv_pairs), 0xa0)
         return length + bjoin(encoded_key + encode_item(value)
                               for encoded_key, value in sorted_pairs(pairs_gen, sort_method))
 
+    def _template(self, value):
+        '''Return the record template for a dict with scalar keys, creating it if necessary, or
+        None.'''
+        shape = tuple(value)
+        entry = self._templates.get(shape)
+        if entry is not None:
+            # Keys equal to strings are strings.  Otherwise check the types as 1 == True == 1.0.
+            if entry[0] is None:
+                return entry[1]
+            key_types = tuple(map(type, shape))
+            if entry[0] == key_types:
+                return entry[1]
+        elif len(shape) > MAX_TEMPLATE_KEYS:
+            return None
+        else:
+            key_types = tuple(map(type, shape))
+        type_set = set(key_types)
+        if not type_set or not type_set.issubset(self._template_key_types):
+            return None
+        if len(self._templates) >= MAX_TEMPLATES:
+            self._templates.clear()
+        template = RecordTemplate(shape, self.sort_method, self)
+        self._templates[shape] = (None if type_set == {str} else key_types, template)
+        return template
+
     def encode_dict(self, value):
+        template = self._template(value)
+        if template:
+            return template.encode(value, self)
         return self.encode_sorted_dict(value.items(), self.sort_method)
 
     def encode_ordered_dict(self, value):
@@ -217,6 +480,9 @@ class CBOREncoder:
     def encode_tag(self, value):
         return pack_cbor_length(value, 0xc0)
 
+    def encode_raw(self, value):
+        return value.encoding
+
     def encode_datetime(self, value):
         if not value.tzinfo:
             if self.tzinfo:
@@ -273,30 +539,594 @@ class CBOREncoder:
         pairs = [(value.network_address.packed, value.prefixlen)]
         return self.encode_tag(261) + self.encode_sorted_dict(pairs, SortMethod.UNSORTED)
 
-    def encode_typed_array(self, value):
+    def _typed_array_tag(self, value):
         tag = typecode_to_tag_map.get(value.typecode)
         if not tag:
             raise EncodingError(f'cannot encode arrays with typecode {value.typecode}')
-        return self.encode_tag(tag) + self.encode_byte_string(value.tobytes())
+        return tag
+
+    def encode_typed_array(self, value):
+        tag = self._typed_array_tag(value)
+        return self.encode_tag(tag) + self.encode_byte_string(memoryview(value).cast('B'))
+
+    def _buffer_parts(self, value):
+        '''Return a pair (header, payload) for a memoryview.  payload is a view of its bytes,
+        and header is its encoding up to the byte string holding them.'''
+        # One-dimensional views of unsigned bytes or chars are byte strings
+        is_bytes = value.ndim == 1 and value.format.lstrip('@=<>!') in ('B', 'c')
+        if value.c_contiguous:
+            payload = value if is_bytes and value.format == 'B' else value.cast('B')
+        else:
+            payload = memoryview(value.tobytes())
+        if is_bytes:
+            return pack_cbor_length(len(payload), 0x40), payload
+        tag = buffer_format_to_tag(value.format)
+        if tag is None:
+            raise EncodingError(f'cannot encode buffers with format {value.format}')
+        header = self.encode_tag(tag) + pack_cbor_length(len(payload), 0x40)
+        if value.ndim > 1:
+            # A row-major multi-dimensional array: [dimensions, typed array]
+            header = self.encode_tag(40) + b'\x82' + self.encode_ordered_list(value.shape) + header
+        return header, payload
+
+    def encode_buffer(self, value):
+        '''Encode a one-dimensional memoryview of unsigned bytes or chars as a byte string, and
+        other memoryviews as typed arrays.'''
+        header, payload = self._buffer_parts(value)
+        return header + payload
+
+    def _buffer_view(self, value):
+        try:
+            return memoryview(value)
+        except TypeError:
+            raise EncodingError(f'do not know how to encode object of type '
+                                f'{value.__class__}') from None
+
+    def encode_buffer_object(self, value):
+        '''Encode an object supporting the buffer protocol as encode_buffer() would a
+        memoryview of it.'''
+        return self.encode_buffer(self._buffer_view(value))
 
     def encode_item(self, value):
         encode_func = self._encode_funcs.get(value.__class__) or self._encode_func(value.__class__)
         return encode_func(value)
 
+    # Writers append to the output buffer rather than returning bytes.  Types without a
+    # writer are encoded to bytes and appended.
+
+    def _write_encoded(self, encode_func, value):
+        self._out += encode_func(value)
+
+    def _default_func_text(self, funcs, encode_func):
+        '''Return the name of the method in funcs equivalent to encode_func, or None if there
+        is none or a subclass overrides encode_func.'''
+        # Shared types, codecs and __encode_cbor__ methods are wrapped in partials and have no
+        # name
+        name = getattr(encode_func, '__name__', None)
+        if name in self._overrides:
+            return None
+        return funcs.get(name)
+
+    def _write_func(self, vtype):
+        encode_func = self._encode_funcs.get(vtype) or self._encode_func(vtype)
+        func_text = self._default_func_text(default_write_funcs, encode_func)
+        codec = self._codecs.get(vtype)
+        if codec and vtype not in self.shared_types:
+            write_func = partial(codec.write, encoder=self)
+        elif func_text:
+            write_func = getattr(self, func_text)
+        else:
+            write_func = partial(self._write_encoded, encode_func)
+        self._write_funcs[vtype] = write_func
+        return write_func
+
+    def write_int(self, value):
+        try:
+            if value >= 0:
+                write_cbor_length(self._out, value, 0x00)
+            else:
+                write_cbor_length(self._out, -1 - value, 0x20)
+        except OverflowError:
+            self._out += self.encode_bignum(value)
+
+    def _reference(self, payload):
+        '''Add the buffered output, and then payload itself, to the segments.'''
+        out = self._out
+        if out:
+            self._segments.append(bytes(out))
+            out.clear()
+        self._segments.append(payload)
+
+    def write_byte_string(self, value):
+        out = self._out
+        write_cbor_length(out, len(value), 0x40)
+        if len(value) >= self._min_segment_length:
+            self._reference(value)
+        else:
+            out += value
+
+    def write_raw(self, value):
+        encoding = value.encoding
+        if len(encoding) >= self._min_segment_length:
+            self._reference(encoding)
+        else:
+            self._out += encoding
+
+    def write_typed_array(self, value):
+        write_cbor_length(self._out, self._typed_array_tag(value), 0xc0)
+        self.write_byte_string(memoryview(value).cast('B'))
+
+    def write_buffer(self, value):
+        out = self._out
+        header, payload = self._buffer_parts(value)
+        out += header
+        if len(payload) >= self._min_segment_length:
+            self._reference(payload)
+        else:
+            out += payload
+
+    def write_buffer_object(self, value):
+        self.write_buffer(self._buffer_view(value))
+
+    def write_text_string(self, value):
+        out = self._out
+        value_utf8 = value.encode()
+        write_cbor_length(out, len(value_utf8), 0x60)
+        out += value_utf8
+
+    def _write_bulk_list(self, value):
+        '''Write a list or tuple of only ints 0 to 23, or of only floats, in bulk.  Return
+        True if it was written.'''
+        vtype = value[0].__class__
+        if vtype not in self._bulk_types:
+            return False
+        if set(map(type, value)) != {vtype}:
+            return False
+        if vtype is int:
+            # Such ints encode as themselves
+            try:
+                encoding = bytes(value)
+            except ValueError:
+                return False
+            if max(encoding) >= 24:
+                return False
+        elif self.float_style == CBORFloatStyle.SHORTEST:
+            encoding = pack_cbor_short_floats(value)
+        else:
+            encoding = pack_cbor_doubles(value)
+        out = self._out
+        write_cbor_length(out, len(value), 0x80)
+        out += encoding
+        return True
+
+    def write_ordered_list(self, value):
+        if len(value) >= BULK_MIN_LENGTH and self._write_bulk_list(value):
+            return
+        write_cbor_length(self._out, len(value), 0x80)
+        write_funcs = self._write_funcs
+        write_func = self._write_func
+        for item in value:
+            (write_funcs.get(item.__class__) or write_func(item.__class__))(item)
+
+    def write_dict(self, value):
+        template = self._template(value)
+        if template:
+            template.write(value, self)
+            return
+        out = self._out
+        write_item = self.write_item
+        write_cbor_length(out, len(value), 0xa0)
+        if self.sort_method == SortMethod.UNSORTED:
+            write_key = self._write_key
+            for key, kvalue in value.items():
+                write_key(key)
+                write_item(kvalue)
+        else:
+            encode_key = self._encode_key
+            pairs_gen = ((encode_key(key), kvalue) for key, kvalue in value.items())
+            for encoded_key, kvalue in sorted_pairs(pairs_gen, self.sort_method):
+                out += encoded_key
+                write_item(kvalue)
+
+    def write_bool(self, value):
+        self._out.append(0xf5 if value else 0xf4)
+
+    def write_None(self, _value):
+        self._out.append(0xf6)
+
+    def write_float(self, value):
+        self._out += self.encode_float(value)
+
+    def write_item(self, value):
+        write_func = self._write_funcs.get(value.__class__) or self._write_func(value.__class__)
+        write_func(value)
+
+    def _dict_items(self, value, ordered=False):
+        '''Write the keys of a dict to the output buffer in encoding order, writing each value
+        that is not a container after its key and yielding the others.  The keys of ordered
+        dicts are not sorted.'''
+        out = self._out
+        leaf_funcs = self._leaf_funcs
+        chunk_size = self._chunk_size
+        template = None if ordered else self._template(value)
+        if template:
+            for encoded_key, kvalue in zip(template.encoded_keys, template.values(value)):
+                out += encoded_key
+                write_func = leaf_funcs.get(kvalue.__class__)
+                if write_func is None or len(out) >= chunk_size:
+                    yield kvalue
+                else:
+                    write_func(kvalue)
+        elif ordered or self.sort_method == SortMethod.UNSORTED:
+            write_key = self._write_key
+            for key, kvalue in value.items():
+                write_key(key)
+                write_func = leaf_funcs.get(kvalue.__class__)
+                if write_func is None or len(out) >= chunk_size:
+                    yield kvalue
+                else:
+                    write_func(kvalue)
+        else:
+            encode_key = self._encode_key
+            pairs_gen = ((encode_key(key), kvalue) for key, kvalue in value.items())
+            for encoded_key, kvalue in sorted_pairs(pairs_gen, self.sort_method):
+                out += encoded_key
+                write_func = leaf_funcs.get(kvalue.__class__)
+                if write_func is None or len(out) >= chunk_size:
+                    yield kvalue
+                else:
+                    write_func(kvalue)
+
+    # Walkers are used by the iterative engine.  The walker of a container type writes its
+    # header and returns an iterator of its members, or None if it wrote it whole.  Other
+    # types are walked by their writers.
+
+    def _walk_list(self, value):
+        if len(value) >= BULK_MIN_LENGTH and self._write_bulk_list(value):
+            return None
+        out = self._out
+        write_cbor_length(out, len(value), 0x80)
+        # Leading members that are not containers are written here rather than passed back
+        # one by one, so a list of them is written whole
+        leaf_funcs = self._leaf_funcs
+        chunk_size = self._chunk_size
+        members = iter(value)
+        for item in members:
+            write_func = leaf_funcs.get(item.__class__)
+            if write_func is None or len(out) >= chunk_size:
+                return itertools.chain((item, ), members)
+            write_func(item)
+        return None
+
+    def _walk_dict(self, value):
+        write_cbor_length(self._out, len(value), 0xa0)
+        return self._dict_items(value)
+
+    def _walk_ordered_dict(self, value):
+        out = self._out
+        out += b'\xd9\x01\x10'
+        write_cbor_length(out, len(value), 0xa0)
+        return self._dict_items(value, ordered=True)
+
+    def _walk_tag(self, value):
+        write_cbor_length(self._out, value.tag, 0xc0)
+        return iter((value.value, ))
+
+    def _walk_shared(self, walk_func, value):
+        value_id = id(value)
+        value_ref = self._shared_ids.get(value_id)
+        if value_ref is None:
+            self._shared_ids[value_id] = next(self._shared_id)
+            self._out += b'\xd8\x1c'
+            return walk_func(value)
+        self._out += b'\xd8\x1d'
+        self.write_int(value_ref)
+        return None
+
+    def _walk_func(self, vtype):
+        encode_func = self._encode_funcs.get(vtype) or self._encode_func(vtype)
+        shared = isinstance(encode_func, partial) and encode_func.func == self._encode_shared
+        if shared:
+            encode_func = encode_func.args[0]
+        # Memoized containers are walked afresh; hashing a deeply nested one would recurse
+        if isinstance(encode_func, partial) and encode_func.func == self._encode_memoized:
+            encode_func = encode_func.args[0]
+        func_text = self._default_func_text(default_walk_funcs, encode_func)
+        if isinstance(encode_func, partial) and encode_func.func is CBORTag.__encode_cbor__:
+            func_text = '_walk_tag'
+        if func_text:
+            walk_func = getattr(self, func_text)
+            if shared:
+                walk_func = partial(self._walk_shared, walk_func)
+        else:
+            walk_func = self._leaf_funcs[vtype] = (self._write_funcs.get(vtype)
+                                                   or self._write_func(vtype))
+        self._walk_funcs[vtype] = walk_func
+        return walk_func
+
+    def _iter_items(self, items, chunk_size):
+        '''Write items to the output buffer.  Lists, dicts, ordered dicts and tags are walked
+        with an explicit stack rather than by recursion, so their nesting depth is unlimited.
+        Yields whenever the buffer holds chunk_size bytes or more so the caller can flush it.
+
+        A container within itself would be walked forever, so the ids of the enclosing
+        containers more than CYCLE_CHECK_DEPTH deep are tracked and meeting one again raises
+        EncodingError.  Shallower containers are not tracked, saving the cost for typical
+        documents; a cycle through them repeats below that depth and is caught there.
+        '''
+        out = self._out
+        self._chunk_size = chunk_size
+        walk_funcs = self._walk_funcs
+        walk_func = self._walk_func
+        # The member iterators of the enclosing containers, and the ids of those tracked
+        stack = []
+        push = stack.append
+        pop = stack.pop
+        tracked_ids = []
+        active_ids = set()
+        members = iter(items)
+        while True:
+            for item in members:
+                # Checked before each item as walkers write container headers and members
+                if len(out) >= chunk_size:
+                    yield
+                item_members = (walk_funcs.get(item.__class__) or walk_func(item.__class__))(item)
+                if item_members is None:
+                    continue
+                if len(stack) >= CYCLE_CHECK_DEPTH:
+                    item_id = id(item)
+                    if item_id in active_ids:
+                        raise EncodingError('self-referential object detected')
+                    active_ids.add(item_id)
+                    tracked_ids.append(item_id)
+                push(members)
+                members = item_members
+                break
+            else:
+                if not stack:
+                    return
+                members = pop()
+                if len(stack) >= CYCLE_CHECK_DEPTH:
+                    active_ids.discard(tracked_ids.pop())
+
+    # Sizers return the length of an item's encoding without producing it.  Types without a
+    # sizer are encoded and measured.
+
+    def _size_encoded(self, encode_func, value):
+        return len(encode_func(value))
+
+    def _size_func(self, vtype):
+        encode_func = self._encode_funcs.get(vtype) or self._encode_func(vtype)
+        func_text = self._default_func_text(default_size_funcs, encode_func)
+        if func_text:
+            size_func = getattr(self, func_text)
+        else:
+            size_func = partial(self._size_encoded, encode_func)
+        self._size_funcs[vtype] = size_func
+        return size_func
+
+    def size_int(self, value):
+        magnitude = value if value >= 0 else -1 - value
+        try:
+            return cbor_length_size(magnitude)
+        except OverflowError:
+            # A tagged bignum
+            length = (magnitude.bit_length() + 7) // 8
+            return 1 + cbor_length_size(length) + length
+
+    def size_byte_string(self, value):
+        return cbor_length_size(len(value)) + len(value)
+
+    def size_text_string(self, value):
+        length = len(value) if value.isascii() else len(value.encode())
+        return cbor_length_size(length) + length
+
+    def size_ordered_list(self, value):
+        return cbor_length_size(len(value)) + sum(map(self.size_item, value))
+
+    def size_set(self, value):
+        return cbor_length_size(258) + self.size_ordered_list(value)
+
+    def size_dict(self, value):
+        # Sorting does not change the size
+        size_item = self.size_item
+        template = self._template(value)
+        if template:
+            return template.keys_size + sum(map(size_item, value.values()))
+        return (cbor_length_size(len(value)) + sum(map(size_item, value))
+                + sum(map(size_item, value.values())))
+
+    def size_ordered_dict(self, value):
+        return cbor_length_size(272) + self.size_dict(value)
+
+    def size_bool(self, _value):
+        return 1
+
+    def size_None(self, _value):
+        return 1
+
+    def size_float(self, value):
+        if self.float_style == CBORFloatStyle.SHORTEST:
+            return len(pack_cbor_short_float(value))
+        return 9
+
+    def size_raw(self, value):
+        return len(value.encoding)
+
+    def size_typed_array(self, value):
+        length = len(value) * value.itemsize
+        return (cbor_length_size(self._typed_array_tag(value)) + cbor_length_size(length)
+                + length)
+
+    def size_item(self, value):
+        size_func = self._size_funcs.get(value.__class__) or self._size_func(value.__class__)
+        return size_func(value)
+
     # External APIs
 
+    def encoded_size(self, value):
+        '''Return the length of the encoding of value that encode() would return.
+
+        Lengths, integers, strings, floats and containers of them are measured without
+        being encoded.  Other types are encoded and measured.  With shared types the whole
+        value is encoded, as references depend on encoding order, and the encoder's shared
+        state is restored afterwards.
+        '''
+        if self.shared_types:
+            shared_id, shared_ids = next(self._shared_id), self._shared_ids.copy()
+            try:
+                return len(self.encode(value))
+            finally:
+                self._shared_id, self._shared_ids = itertools.count(shared_id), shared_ids
+        try:
+            return self.size_item(value)
+        except RecursionError:
+            raise EncodingError('self-referential object detected') from None
+
+    def encode_into(self, value, buffer, offset=0):
+        '''Write the encoding of value into buffer, a writable object supporting the buffer
+        protocol such as a bytearray, mmap or shared memory, starting at offset.  Return the
+        offset following the encoding.  Raise ValueError if it does not fit.'''
+        saved_out, saved_min_segment_length = self._out, self._min_segment_length
+        self._out = out = bytearray()
+        self._min_segment_length = NO_SEGMENTS
+        try:
+            self.write_item(value)
+        except RecursionError:
+            raise EncodingError('self-referential object detected') from None
+        finally:
+            self._out, self._min_segment_length = saved_out, saved_min_segment_length
+        end = offset + len(out)
+        with memoryview(buffer) as view, view.cast('B') as byte_view:
+            if offset < 0 or end > len(byte_view):
+                raise ValueError(f'encoding of {len(out):,d} bytes at offset {offset:,d} '
+                                 f'does not fit in a buffer of {len(byte_view):,d} bytes')
+            byte_view[offset: end] = out
+        return end
+
     def encode(self, value):
+        '''Return the encoding of value as a bytes object.  The encoding is written to a
+        single output buffer and copied once.
+
+        If the encoder is iterative, containers are walked with an explicit stack as for
+        iterencode(), so nesting depth is unlimited.  This is slower than the default
+        recursive writer, typically by around 10 percent, so only enable it for data that
+        may be nested too deeply for recursion.
+        '''
+        saved = self._out, self._min_segment_length, self._chunk_size
+        self._out = bytearray()
+        self._min_segment_length = NO_SEGMENTS
+        try:
+            if self.iterative:
+                for _ in self._iter_items((value, ), NO_SEGMENTS):
+                    pass
+            else:
+                self.write_item(value)
+            return bytes(self._out)
+        except RecursionError:
+            raise EncodingError('self-referential object detected') from None
+        finally:
+            self._out, self._min_segment_length, self._chunk_size = saved
+
+    def iterencode(self, value, chunk_size=DEFAULT_CHUNK_SIZE):
+        '''Encode value, yielding its encoding as a sequence of bytes objects.
+
+        Output is buffered until it reaches chunk_size bytes, so memory use depends on
+        chunk_size rather than on the size of the encoding.  A chunk can exceed chunk_size
+        by the size of a single string or of an item whose type has no writer.
+        '''
+        saved_out = self._out
+        self._out = out = bytearray()
         try:
-            return self.encode_item(value)
+            for _ in self._iter_items((value, ), chunk_size):
+                yield bytes(out)
+                out.clear()
         except RecursionError:
             raise EncodingError('self-referential object detected') from None
+        finally:
+            self._out = saved_out
+        if out:
+            yield bytes(out)
+
+    def itersegments(self, value, chunk_size=DEFAULT_CHUNK_SIZE,
+                     min_segment_length=DEFAULT_MIN_SEGMENT_LENGTH):
+        '''Encode value, yielding its encoding as a sequence of lists of buffers.
+
+        As for iterencode(), except that byte string payloads of at least min_segment_length
+        bytes are not copied to the output buffer.  Instead the object itself, or a view of
+        it, appears in the list between the buffered output before and after it.  Such
+        objects must not be modified until the segments are written.
+        '''
+        saved_state = self._out, self._segments, self._min_segment_length
+        self._out = out = bytearray()
+        self._segments = segments = []
+        self._min_segment_length = min_segment_length
+        try:
+            for _ in self._iter_items((value, ), chunk_size):
+                segments.append(bytes(out))
+                out.clear()
+                yield segments
+                self._segments = segments = []
+        except RecursionError:
+            raise EncodingError('self-referential object detected') from None
+        finally:
+            self._out, self._segments, self._min_segment_length = saved_state
+        if out:
+            segments.append(bytes(out))
+        if segments:
+            yield segments
+
+    def encode_segments(self, value, min_segment_length=DEFAULT_MIN_SEGMENT_LENGTH):
+        '''Return the encoding of value as a list of buffers, as itersegments() yields
+        them, whose concatenation is the encoding.'''
+        return [segment for segments in self.itersegments(value, NO_SEGMENTS, min_segment_length)
+                for segment in segments]
+
+
+def write_vectored(writev, segments):
+    '''Write all the segments with writev, a function like os.writev() taking a list of
+    buffers and returning the number of bytes written, which may be fewer than requested.'''
+    views = [memoryview(segment) for segment in segments if len(segment)]
+    start = 0
+    while start < len(views):
+        written = writev(views[start: start + MAX_IOVECS])
+        if not written:
+            raise OSError('no bytes were written')
+        while written:
+            length = len(views[start])
+            if written >= length:
+                written -= length
+                start += 1
+            else:
+                views[start] = views[start][written:]
+                written = 0
+
+
+def segments_writer(fp):
+    '''Return a function that writes a list of buffers to fp.  Sockets are written with
+    sendmsg() and unbuffered files with os.writev(), each list in as few system calls as
+    possible.  SSL sockets, which do not support sendmsg(), are passed each buffer with
+    sendall(), and other objects with write().'''
+    if isinstance(fp, SSLSocket):
+        write = fp.sendall
+    elif isinstance(fp, socket.socket):
+        return partial(write_vectored, fp.sendmsg)
+    elif isinstance(fp, io.FileIO) and hasattr(os, 'writev'):
+        return partial(write_vectored, partial(os.writev, fp.fileno()))
+    else:
+        write = fp.write
+
+    def write_segments(segments):
+        for segment in segments:
+            write(segment)
+    return write_segments
 
 
 default_encode_funcs = {
     int: 'encode_int',
     bytes: 'encode_byte_string',
     bytearray: 'encode_byte_string',
-    memoryview: 'encode_byte_string',
+    memoryview: 'encode_buffer',
     str: 'encode_text_string',
     tuple: 'encode_ordered_list',
     list: 'encode_ordered_list',
@@ -310,6 +1140,7 @@ default_encode_funcs = {
     OrderedDict: 'encode_ordered_dict',
     FrozenOrderedDict: 'encode_ordered_dict',
     array: 'encode_typed_array',
+    RawCBOR: 'encode_raw',
     datetime: 'encode_datetime',
     date: 'encode_date',
     Decimal: 'encode_decimal',
@@ -322,23 +1153,157 @@ default_encode_funcs = {
     IPv6Network: 'encode_ip_network',
 }
 
+# Maps encoding methods to the equivalent writer
+default_write_funcs = {
+    'encode_int': 'write_int',
+    'encode_byte_string': 'write_byte_string',
+    'encode_text_string': 'write_text_string',
+    'encode_typed_array': 'write_typed_array',
+    'encode_raw': 'write_raw',
+    'encode_buffer': 'write_buffer',
+    'encode_buffer_object': 'write_buffer_object',
+    'encode_ordered_list': 'write_ordered_list',
+    'encode_dict': 'write_dict',
+    'encode_bool': 'write_bool',
+    'encode_None': 'write_None',
+    'encode_float': 'write_float',
+}
+
+# Maps encoding methods of containers to the walker the iterative engine uses
+default_walk_funcs = {
+    'encode_ordered_list': '_walk_list',
+    'encode_dict': '_walk_dict',
+    'encode_ordered_dict': '_walk_ordered_dict',
+}
+
+# Maps encoding methods to the equivalent sizer
+default_size_funcs = {
+    'encode_int': 'size_int',
+    'encode_byte_string': 'size_byte_string',
+    'encode_text_string': 'size_text_string',
+    'encode_typed_array': 'size_typed_array',
+    'encode_raw': 'size_raw',
+    'encode_ordered_list': 'size_ordered_list',
+    'encode_sorted_list': 'size_ordered_list',
+    'encode_set': 'size_set',
+    'encode_dict': 'size_dict',
+    'encode_ordered_dict': 'size_ordered_dict',
+    'encode_bool': 'size_bool',
+    'encode_None': 'size_None',
+    'encode_float': 'size_float',
+}
+
 
 #
 # External interface
 #
 
+encoder_pool = CodecPool(CBOREncoder)
+
+
 def dumps(obj, **kwargs):
     '''Serialize obj to a CBOR-formatted bytes object.
 
     kwargs: arguments to pass to CBOREncoder
     '''
-    e = CBOREncoder(**kwargs)
-    return e.encode(obj)
+    key, encoder = encoder_pool.acquire((), kwargs)
+    try:
+        return encoder.encode(obj)
+    finally:
+        encoder_pool.release(key, encoder)
+
+
+def dump(obj, fp, *, chunk_size=DEFAULT_CHUNK_SIZE,
+         min_segment_length=DEFAULT_MIN_SEGMENT_LENGTH, **kwargs):
+    '''Serialize obj to fp (a .write() supporting file-like object, or a socket).
+
+    Byte strings of at least min_segment_length bytes are written from the objects
+    themselves rather than copied into the output buffer.  Sockets are written with sendmsg()
+    and unbuffered files (io.FileIO) with os.writev().
+
+    chunk_size: output is written to fp whenever this many bytes have been buffered
+    kwargs: arguments to pass to CBOREncoder
+    '''
+    write_segments = segments_writer(fp)
+    key, encoder = encoder_pool.acquire((), kwargs)
+    try:
+        for segments in encoder.itersegments(obj, chunk_size, min_segment_length):
+            write_segments(segments)
+    finally:
+        encoder_pool.release(key, encoder)
+
+
+async def _awrite_chunks(chunks, writer, high_water, unflushed=0):
+    '''Write chunks to writer, an asyncio.StreamWriter, waiting for it to drain whenever
+    high_water bytes have been written since it last drained.  Return the number of bytes
+    written since then.'''
+    write = writer.write
+    for chunk in chunks:
+        write(chunk)
+        unflushed += len(chunk)
+        if unflushed >= high_water:
+            await writer.drain()
+            unflushed = 0
+    return unflushed
 
 
-def dump(obj, fp, **kwargs):
-    '''Serialize obj to fp (a .write() supporting file-like object).
+async def adump(obj, writer, *, chunk_size=DEFAULT_CHUNK_SIZE, high_water=DEFAULT_HIGH_WATER,
+                **kwargs):
+    '''Serialize obj to writer, an asyncio.StreamWriter.
 
+    The encoding is produced incrementally in chunks, and the writer is drained whenever
+    high_water bytes have been written, so neither the event loop is blocked nor the
+    whole encoding held in memory for long.  The writer is drained before returning.
+
+    chunk_size: the number of bytes buffered before each write to writer
+    high_water: the number of bytes written between waits for writer to drain
     kwargs: arguments to pass to CBOREncoder
     '''
-    fp.write(dumps(obj, **kwargs))
+    key, encoder = encoder_pool.acquire((), kwargs)
+    try:
+        await _awrite_chunks(encoder.iterencode(obj, chunk_size), writer, high_water)
+    finally:
+        encoder_pool.release(key, encoder)
+    await writer.drain()
+
+
+class AsyncSequenceWriter:
+    '''Writes a CBOR sequence (RFC 8742) to an asyncio.StreamWriter, one item at a time.
+
+    Each item is encoded incrementally as for adump(), and the writer is drained whenever
+    high_water bytes have been written since it last drained.  Shared values are not
+    shared across items.
+    '''
+
+    def __init__(self, writer, *, chunk_size=DEFAULT_CHUNK_SIZE, high_water=DEFAULT_HIGH_WATER,
+                 **kwargs):
+        '''kwargs: arguments to pass to CBOREncoder'''
+        self._writer = writer
+        self._chunk_size = chunk_size
+        self._high_water = high_water
+        self._encoder = CBOREncoder(**kwargs)
+        self._unflushed = 0
+
+    async def write(self, obj):
+        '''Encode obj and write it as the next item of the sequence.'''
+        encoder = self._encoder
+        encoder.reset()
+        self._unflushed = await _awrite_chunks(encoder.iterencode(obj, self._chunk_size),
+                                               self._writer, self._high_water, self._unflushed)
+
+    async def drain(self):
+        '''Wait until the writer has flushed everything written.'''
+        self._unflushed = 0
+        await self._writer.drain()
+
+    async def close(self):
+        '''Drain and close the writer.'''
+        await self.drain()
+        self._writer.close()
+        await self._writer.wait_closed()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
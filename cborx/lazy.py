@@ -0,0 +1,187 @@
+# Copyright (c) 2020, Neil Booth
+#
+# All rights reserved.
+#
+# The MIT License (MIT)
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+# LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+# WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+'''Lazily-decoded views of CBOR-encoded data.'''
+
+__all__ = ('loads_lazy', 'LazyArray', 'LazyMap')
+
+
+from collections.abc import Mapping, Sequence
+
+from cborx.decoder import CBORBufferDecoder, DecoderFlags
+from cborx.types import DuplicateKeyError, UnconsumedDataError
+
+
+def decode_at(decoder, offset, flags=0):
+    '''Decode the item at offset.  The decoder is shared by all views of a document, so its
+    state is reset before and after, in case an earlier decode failed part way through.'''
+    decoder._pos = offset
+    decoder._flags = decoder._initial_flags | flags
+    decoder._pending_id = None
+    try:
+        return decoder.decode_item()
+    finally:
+        decoder._flags = decoder._initial_flags
+        decoder._pending_id = None
+
+
+def lazy_item(decoder, offset):
+    '''Return a view of the item at offset if it is an array or map, otherwise decode it.'''
+    decoder._pos = offset
+    major = decoder.read_byte() >> 5
+    if major == 4:
+        return LazyArray(decoder, offset)
+    if major == 5:
+        return LazyMap(decoder, offset)
+    return decode_at(decoder, offset)
+
+
+class LazyView:
+    '''Base class of views of an encoded array or map.
+
+    A view records the offsets of its members when first needed, and decodes and caches a
+    member only when it is accessed.  Members that are arrays or maps are themselves views.
+    '''
+
+    __slots__ = ('_decoder', '_offset', '_offsets')
+
+    def __init__(self, decoder, offset):
+        self._decoder = decoder
+        self._offset = offset
+        self._offsets = None
+
+    def _member_offsets(self, items_per_member):
+        '''Return the offsets of the items in the container.'''
+        decoder = self._decoder
+        decoder._pos = self._offset
+        length = decoder.decode_length(decoder.read_byte())
+        read_byte = decoder.read_byte
+        skip_item = decoder.skip_item
+        offsets = []
+        if length == -1:
+            while read_byte() != 0xff:
+                decoder._pos -= 1
+                offsets.append(decoder._pos)
+                skip_item()
+        else:
+            for _ in range(length * items_per_member):
+                offsets.append(decoder._pos)
+                skip_item()
+        return offsets
+
+    def materialize(self):
+        '''Decode the whole container as CBORDecoder would.'''
+        return decode_at(self._decoder, self._offset)
+
+    def __repr__(self):
+        return f'<{self.__class__.__name__} at offset {self._offset:,d}>'
+
+
+class LazyArray(LazyView, Sequence):
+    '''A lazily-decoded view of an encoded array.'''
+
+    __slots__ = ('_items', )
+
+    def _ensure_offsets(self):
+        if self._offsets is None:
+            self._offsets = self._member_offsets(1)
+            self._items = {}
+        return self._offsets
+
+    def __len__(self):
+        return len(self._ensure_offsets())
+
+    def __getitem__(self, index):
+        offsets = self._ensure_offsets()
+        if isinstance(index, slice):
+            return [self[n] for n in range(*index.indices(len(offsets)))]
+        offset = offsets[index]
+        try:
+            return self._items[offset]
+        except KeyError:
+            value = self._items[offset] = lazy_item(self._decoder, offset)
+            return value
+
+    def __eq__(self, other):
+        if not isinstance(other, Sequence) or isinstance(other, (str, bytes)):
+            return NotImplemented
+        return len(self) == len(other) and all(a == b for a, b in zip(self, other))
+
+    __hash__ = None
+
+
+class LazyMap(LazyView, Mapping):
+    '''A lazily-decoded view of an encoded map.  Keys are decoded when the view is first
+    used; values are decoded when accessed.'''
+
+    __slots__ = ('_values', )
+
+    def _ensure_offsets(self):
+        if self._offsets is None:
+            decoder = self._decoder
+            offsets = self._member_offsets(2)
+            value_offsets = {}
+            for key_offset, value_offset in zip(offsets[::2], offsets[1::2]):
+                key = decode_at(decoder, key_offset, DecoderFlags.IMMUTABLE)
+                if key in value_offsets:
+                    raise DuplicateKeyError(f'map has a duplicate key {key!r}')
+                value_offsets[key] = value_offset
+            self._offsets = value_offsets
+            self._values = {}
+        return self._offsets
+
+    def __len__(self):
+        return len(self._ensure_offsets())
+
+    def __iter__(self):
+        return iter(self._ensure_offsets())
+
+    def __contains__(self, key):
+        return key in self._ensure_offsets()
+
+    def __getitem__(self, key):
+        offset = self._ensure_offsets()[key]
+        try:
+            return self._values[offset]
+        except KeyError:
+            value = self._values[offset] = lazy_item(self._decoder, offset)
+            return value
+
+
+def loads_lazy(raw, *, check_eof=False, **kwargs):
+    '''Deserialize a raw binary (e.g. bytes) object containing a CBOR document.  If it is an
+    array or map, return a LazyArray or LazyMap view of it, otherwise the decoded value.
+
+    Shared values (tags 28 and 29) are only resolved within a single decoded member.
+
+    check_eof: if True, the whole document is scanned to check no data follows it
+    kwargs: arguments to pass to CBORBufferDecoder
+    '''
+    decoder = CBORBufferDecoder(raw, check_eof=check_eof, **kwargs)
+    if check_eof:
+        decoder.skip_item()
+        if decoder._pos != decoder._end:
+            raise UnconsumedDataError('not all input consumed')
+    return lazy_item(decoder, 0)
@@ -26,7 +26,8 @@
 
 '''Encourage efficient bytes manipulation'''
 
-from struct import Struct
+from operator import eq, ne
+from struct import Struct, pack, unpack
 
 
 struct_le_i = Struct('<i')
@@ -69,6 +70,7 @@ unpack_be_uint32_from = struct_be_I.unpack_from
 unpack_be_uint64 = struct_be_Q.unpack
 unpack_be_uint64_from = struct_be_Q.unpack_from
 unpack_byte = structB.unpack
+unpack_byte_from = structB.unpack_from
 
 pack_be_float2 = struct_be_e.pack
 pack_be_float4 = struct_be_f.pack
@@ -76,12 +78,18 @@ pack_be_float8 = struct_be_d.pack
 unpack_be_float2 = struct_be_e.unpack
 unpack_be_float4 = struct_be_f.unpack
 unpack_be_float8 = struct_be_d.unpack
+unpack_be_float2_from = struct_be_e.unpack_from
+unpack_be_float4_from = struct_be_f.unpack_from
+unpack_be_float8_from = struct_be_d.unpack_from
 
 hex_to_bytes = bytes.fromhex
 
 
 uint_unpackers = [unpack_byte, unpack_be_uint16, unpack_be_uint32, unpack_be_uint64]
 be_float_unpackers = [unpack_be_float2, unpack_be_float4, unpack_be_float8]
+uint_unpackers_from = [unpack_byte_from, unpack_be_uint16_from, unpack_be_uint32_from,
+                       unpack_be_uint64_from]
+be_float_unpackers_from = [unpack_be_float2_from, unpack_be_float4_from, unpack_be_float8_from]
 
 
 def pack_cbor_length(length, major):
@@ -99,6 +107,42 @@ def pack_cbor_length(length, major):
     raise OverflowError
 
 
+def write_cbor_length(out, length, major):
+    '''Append the CBOR encoding of a length for the given (shifted) major value to out, a
+    bytearray.'''
+    if length < 24:
+        out.append(major + length)
+    elif length < 256:
+        out.append(major + 24)
+        out.append(length)
+    elif length < 65536:
+        out.append(major + 25)
+        out += pack_be_uint16(length)
+    elif length < 4294967296:
+        out.append(major + 26)
+        out += pack_be_uint32(length)
+    elif length < 18446744073709551616:
+        out.append(major + 27)
+        out += pack_be_uint64(length)
+    else:
+        raise OverflowError
+
+
+def cbor_length_size(length):
+    '''Return the size of the CBOR encoding of a length.'''
+    if length < 24:
+        return 1
+    if length < 256:
+        return 2
+    if length < 65536:
+        return 3
+    if length < 4294967296:
+        return 5
+    if length < 18446744073709551616:
+        return 9
+    raise OverflowError
+
+
 def pack_cbor_double(value):
     '''Encoding of a float as an IEEE double-precision payload.'''
     return b'\xfb' + pack_be_float8(value)
@@ -125,3 +169,39 @@ def pack_cbor_short_float(value):
                 return b'\xfa' + pack4
     else:
         return b'\xf9\x7e\x00'
+
+
+def _interleave(initial_byte, packed, size):
+    '''Return packed, a concatenation of size-byte payloads, with initial_byte before each.'''
+    count = len(packed) // size
+    stride = size + 1
+    result = bytearray(stride * count)
+    result[0::stride] = bytes([initial_byte]) * count
+    for n in range(size):
+        result[n + 1::stride] = packed[n::size]
+    return result
+
+
+def pack_cbor_doubles(values):
+    '''Concatenated encodings of a sequence of floats as IEEE double-precision payloads.'''
+    return _interleave(0xfb, pack(f'>{len(values)}d', *values), 8)
+
+
+def pack_cbor_short_floats(values):
+    '''Concatenated shortest encodings of a sequence of floats.  If all are exactly
+    representable in half precision, or none in single precision, they are packed together.'''
+    count = len(values)
+    try:
+        packed = pack(f'>{count}e', *values)
+        # NaNs compare unequal and so are not packed together
+        if unpack(f'>{count}e', packed) == tuple(values):
+            return _interleave(0xf9, packed, 2)
+    except OverflowError:
+        pass
+    try:
+        singles = unpack(f'>{count}f', pack(f'>{count}f', *values))
+        if not any(map(eq, singles, values)) and not any(map(ne, values, values)):
+            return pack_cbor_doubles(values)
+    except OverflowError:
+        pass
+    return b''.join(map(pack_cbor_short_float, values))
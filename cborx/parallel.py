@@ -0,0 +1,231 @@
+# Copyright (c) 2020, Neil Booth
+#
+# All rights reserved.
+#
+# The MIT License (MIT)
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+# LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+# WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+'''Decoding of CBOR sequences and encoding of large containers across a pool of worker
+processes.'''
+
+__all__ = ('load_sequence_parallel', 'dumps_parallel')
+
+
+import heapq
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import chain
+
+from cborx.decoder import CBORBufferDecoder, load_sequence_mmap, mapped_file
+from cborx.encoder import CBOREncoder, dumps, sorted_pairs
+from cborx.packing import pack_cbor_length
+from cborx.types import CBORError, SortMethod
+
+
+DEFAULT_RANGE_SIZE = 1 << 22
+DEFAULT_CHUNK_LENGTH = 10000
+
+# The worker process's decoder over its mapping of the file, or its encoder
+worker_state = {}
+
+
+def item_ranges(raw, range_size):
+    '''Yield (start, end) pairs splitting the CBOR sequence in raw into ranges of at least
+    range_size bytes that begin and end on item boundaries.  Items are skipped by their
+    headers alone.  If the data is ill-formed the remainder is yielded as a final range so that
+    decoding it raises the error in order.'''
+    decoder = CBORBufferDecoder(raw)
+    skip_item = decoder.skip_item
+    end = decoder._end
+    start = 0
+    try:
+        while decoder._pos < end:
+            skip_item()
+            if decoder._pos - start >= range_size:
+                yield start, decoder._pos
+                start = decoder._pos
+    except CBORError:
+        pass
+    if start < end:
+        yield start, end
+
+
+def _init_worker(path, kwargs):
+    mapping_cm = mapped_file(path)
+    worker_state['mapping_cm'] = mapping_cm
+    worker_state['decoder'] = CBORBufferDecoder(mapping_cm.__enter__(), **kwargs)
+
+
+def _decode_range(start, end):
+    '''Return a pair (values, error).  error is None or the exception that stopped decoding
+    after values, so the caller can yield them before raising it.'''
+    decoder = worker_state['decoder']
+    decoder.reset(decoder._buf)
+    decoder._pos = start
+    decoder._end = end
+    values = []
+    try:
+        values.extend(decoder.decode_sequence())
+    except CBORError as e:
+        return values, e
+    return values, None
+
+
+def _range_values(future):
+    values, error = future.result()
+    yield from values
+    if error is not None:
+        raise error
+
+
+def load_sequence_parallel(path, *, workers=None, range_size=DEFAULT_RANGE_SIZE, **kwargs):
+    '''Yield a sequence of python objects, in order, from the file at path containing a
+    sequence of CBOR documents.
+
+    The file is split into ranges of items which are decoded in worker processes, each of
+    which memory-maps the file.  Ranges are handed out as the file is scanned, and at most
+    twice as many ranges as workers are decoded ahead of the consumer.  Decoded values are
+    pickled back to this process, so must be picklable; in particular byte_string_type must
+    be bytes.  Shared values (tags 28 and 29) are only resolved within a single item.
+
+    workers: the number of worker processes, by default the number of CPUs.  If it is 1 the
+             file is decoded in this process with load_sequence_mmap().
+    range_size: the approximate number of bytes of items to decode in each task
+    kwargs: arguments to pass to CBORBufferDecoder; they must be picklable
+    '''
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if workers == 1:
+        yield from load_sequence_mmap(path, **kwargs)
+        return
+    path = os.fspath(path)
+    max_pending = workers * 2
+    pending = deque()
+    executor = ProcessPoolExecutor(workers, initializer=_init_worker,
+                                   initargs=(path, kwargs))
+    try:
+        with mapped_file(path, sequential=True) as mapping:
+            for start, end in item_ranges(mapping, range_size):
+                if len(pending) == max_pending:
+                    yield from _range_values(pending.popleft())
+                pending.append(executor.submit(_decode_range, start, end))
+        while pending:
+            yield from _range_values(pending.popleft())
+    finally:
+        for future in pending:
+            future.cancel()
+        executor.shutdown()
+
+
+def _init_encoder_worker(kwargs):
+    worker_state['encoder'] = CBOREncoder(**kwargs)
+
+
+def _encode_items(items):
+    '''Return the concatenated encodings of a list of items.'''
+    encoding = worker_state['encoder'].encode(items)
+    return encoding[len(pack_cbor_length(len(items), 0x80)):]
+
+
+def _encode_pairs(pairs):
+    '''Return the concatenated encodings of a list of key-value pairs, in order.'''
+    encoding = worker_state['encoder'].encode_sorted_dict(pairs, SortMethod.UNSORTED)
+    return encoding[len(pack_cbor_length(len(pairs), 0xa0)):]
+
+
+def _encode_sorted_pairs(pairs):
+    '''Return a list of (encoded key, encoded value) pairs sorted by the encoder's sort
+    method.'''
+    encoder = worker_state['encoder']
+    encode_key = encoder._encode_key
+    encode_item = encoder.encode_item
+    pairs_gen = ((encode_key(key), value) for key, value in pairs)
+    return [(encoded_key, encode_item(value))
+            for encoded_key, value in sorted_pairs(pairs_gen, encoder.sort_method)]
+
+
+def _ordered_results(executor, func, args, max_pending):
+    '''Yield func(arg) for each arg in args, computed in the executor, in order with at most
+    max_pending calls outstanding.'''
+    pending = deque()
+    try:
+        for arg in args:
+            if len(pending) == max_pending:
+                yield pending.popleft().result()
+            pending.append(executor.submit(func, arg))
+        while pending:
+            yield pending.popleft().result()
+    finally:
+        for future in pending:
+            future.cancel()
+
+
+def dumps_parallel(obj, *, workers=None, chunk_length=DEFAULT_CHUNK_LENGTH, **kwargs):
+    '''Serialize obj to a CBOR-formatted bytes object identical to that dumps() returns.
+
+    If obj is a list, tuple, dict or OrderedDict of at least two chunks of chunk_length
+    items, the chunks are encoded in worker processes with encoders with the same options and
+    joined under the container's header.  The sorted keys of each chunk of a dict are merged.
+    Otherwise, or if there are shared types, obj is encoded in this process with dumps().
+
+    workers: the number of worker processes, by default the number of CPUs
+    chunk_length: the number of items or key-value pairs to encode in each task
+    kwargs: arguments to pass to CBOREncoder; they must be picklable
+    '''
+    if workers is None:
+        workers = os.cpu_count() or 1
+    encoder = CBOREncoder(**kwargs)
+    # Codecs and __encode_cbor__ methods are partials and have no name
+    kind = getattr(encoder._encode_func(obj.__class__), '__name__', None)
+    if (workers == 1 or encoder.shared_types
+            or kind not in ('encode_ordered_list', 'encode_dict', 'encode_ordered_dict')
+            or len(obj) < 2 * chunk_length):
+        return dumps(obj, **kwargs)
+
+    if kind == 'encode_ordered_list':
+        header = pack_cbor_length(len(obj), 0x80)
+        items = obj
+        func = _encode_items
+    else:
+        header = pack_cbor_length(len(obj), 0xa0)
+        items = list(obj.items())
+        if kind == 'encode_ordered_dict':
+            header = encoder.encode_tag(272) + header
+            func = _encode_pairs
+        elif encoder.sort_method == SortMethod.UNSORTED:
+            func = _encode_pairs
+        else:
+            func = _encode_sorted_pairs
+    chunks = (list(items[start: start + chunk_length])
+              for start in range(0, len(items), chunk_length))
+
+    with ProcessPoolExecutor(workers, initializer=_init_encoder_worker,
+                             initargs=(kwargs, )) as executor:
+        results = _ordered_results(executor, func, chunks, workers * 2)
+        if func is not _encode_sorted_pairs:
+            return header + b''.join(results)
+        # Merging is stable, so pairs with equal encoded keys stay in dict order
+        if encoder.sort_method == SortMethod.LEXICOGRAPHIC:
+            merged = heapq.merge(*results, key=lambda pair: pair[0])
+        else:
+            merged = heapq.merge(*results, key=lambda pair: (len(pair[0]), pair[0]))
+        return header + b''.join(chain.from_iterable(merged))
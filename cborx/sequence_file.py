@@ -0,0 +1,197 @@
+# Copyright (c) 2020, Neil Booth
+#
+# All rights reserved.
+#
+# The MIT License (MIT)
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+# LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+# WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+'''Random access to files of CBOR sequences through a sidecar index of item offsets.
+
+The index file is an 8-byte magic, the little-endian 64-bit length of the data indexed,
+and then the little-endian 64-bit offset of each item.
+'''
+
+__all__ = ('SequenceFile', 'scan_offsets', 'update_index')
+
+
+import os
+import sys
+from array import array
+from collections.abc import Sequence
+
+from cborx.decoder import CBORBufferDecoder, mapped_file
+from cborx.packing import pack_le_uint64, unpack_le_uint64_from
+from cborx.types import UnexpectedEOFError
+
+
+INDEX_MAGIC = b'cborXidx'
+INDEX_HEADER_SIZE = 16
+
+
+def index_path(path):
+    '''Return the path of the index of the sequence file at path.'''
+    return os.fspath(path) + '.idx'
+
+
+def scan_offsets(raw, start=0):
+    '''Scan the CBOR sequence in raw from offset start, skipping items without decoding them.
+    Return a pair (offsets, end).  offsets is an array('Q') of the offsets of the complete
+    items, and end is the offset following the last complete item.  A truncated final item,
+    such as one still being appended, is not included.
+    '''
+    decoder = CBORBufferDecoder(raw)
+    decoder._pos = start
+    offsets = array('Q')
+    append = offsets.append
+    skip_item = decoder.skip_item
+    end = decoder._end
+    pos = start
+    try:
+        while pos < end:
+            skip_item()
+            append(pos)
+            pos = decoder._pos
+    except UnexpectedEOFError:
+        pass
+    return offsets, pos
+
+
+def _le_offsets(offsets):
+    if sys.byteorder == 'big':
+        offsets = array('Q', offsets)
+        offsets.byteswap()
+    return offsets
+
+
+def _read_index(path):
+    '''Return (offsets, indexed_length) from the index file, or None if it is missing or
+    invalid.'''
+    try:
+        with open(path, 'rb') as f:
+            data = f.read()
+    except FileNotFoundError:
+        return None
+    if data[:8] != INDEX_MAGIC or (len(data) - INDEX_HEADER_SIZE) % 8:
+        return None
+    indexed_length, = unpack_le_uint64_from(data, 8)
+    offsets = array('Q', data[INDEX_HEADER_SIZE:])
+    if sys.byteorder == 'big':
+        offsets.byteswap()
+    return offsets, indexed_length
+
+
+def _write_index(path, offsets, indexed_length):
+    temp_path = path + '.tmp'
+    with open(temp_path, 'wb') as f:
+        f.write(INDEX_MAGIC + pack_le_uint64(indexed_length))
+        _le_offsets(offsets).tofile(f)
+    os.replace(temp_path, path)
+
+
+def update_index(path):
+    '''Create or bring up to date the index of the sequence file at path, and return the item
+    offsets.  If the file has grown since it was indexed only the new data is scanned and
+    appended to the index.'''
+    idx_path = index_path(path)
+    existing = _read_index(idx_path)
+    with mapped_file(path, sequential=True) as mapping:
+        data_length = len(mapping)
+        if existing is None or existing[1] > data_length:
+            offsets, end = scan_offsets(mapping)
+            _write_index(idx_path, offsets, end)
+            return offsets
+        offsets, indexed_length = existing
+        if indexed_length == data_length:
+            return offsets
+        new_offsets, end = scan_offsets(mapping, indexed_length)
+    with open(idx_path, 'r+b') as f:
+        f.seek(0, os.SEEK_END)
+        _le_offsets(new_offsets).tofile(f)
+        f.seek(8)
+        f.write(pack_le_uint64(end))
+    offsets.extend(new_offsets)
+    return offsets
+
+
+class SequenceFile(Sequence):
+    '''A random-access view of a file containing a CBOR sequence.
+
+    The file is memory-mapped and indexed with update_index(), so that any item is decoded by
+    seeking straight to its offset.  Call refresh() to pick up items appended to the file.
+    '''
+
+    def __init__(self, path, **kwargs):
+        '''kwargs: arguments to pass to CBORBufferDecoder'''
+        self._path = path
+        self._kwargs = kwargs
+        self._mapping_cm = None
+        self.refresh()
+
+    def refresh(self):
+        '''Re-map the file and update its index.'''
+        self.close()
+        self._offsets = update_index(self._path)
+        self._mapping_cm = mapped_file(self._path)
+        mapping = self._mapping_cm.__enter__()
+        self._decoder = CBORBufferDecoder(mapping, **self._kwargs)
+
+    def close(self):
+        if self._mapping_cm is not None:
+            self._decoder = None
+            self._mapping_cm.__exit__(None, None, None)
+            self._mapping_cm = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __len__(self):
+        return len(self._offsets)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[n] for n in range(*index.indices(len(self._offsets)))]
+        decoder = self._decoder
+        decoder.reset(decoder._buf)
+        decoder._pos = self._offsets[index]
+        return decoder.decode_item()
+
+    def offset(self, index):
+        '''Return the offset in the file of the item at index.'''
+        return self._offsets[index]
+
+
+def main(argv=None):
+    '''Create or update the index of each sequence file named on the command line.'''
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Index files of CBOR sequences.')
+    parser.add_argument('paths', nargs='+', metavar='path')
+    args = parser.parse_args(argv)
+    for path in args.paths:
+        offsets = update_index(path)
+        print(f'{path}: {len(offsets):,d} items indexed')
+
+
+if __name__ == '__main__':
+    main()
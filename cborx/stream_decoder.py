@@ -23,7 +23,11 @@
 # OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
 # WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
 
-'''CBOR stream decoding.'''
+'''CBOR stream decoding.
+
+Tags are returned as CBORTag objects without interpretation, unlike CBORDecoder which,
+for example, decodes tag 24 (embedded CBOR) to a lazy EmbeddedCBOR.
+'''
 
 __all__ = ('astreams_sequence', 'streams_sequence', 'diagnostic_form', 'StreamDecoder')
 
@@ -41,7 +41,7 @@ from cborx.util import bjoin, sjoin
 
 __all__ = (
     'Undefined', 'Break', 'CBORSimple', 'CBORTag',
-    'FrozenDict', 'FrozenOrderedDict', 'BigFloat', 'BigNum',
+    'FrozenDict', 'FrozenOrderedDict', 'BigFloat', 'BigNum', 'RawCBOR', 'EmbeddedCBOR',
     'CBORILObject', 'CBORILByteString', 'CBORILTextString', 'CBORILList', 'CBORILDict',
     'CBORError', 'EncodingError', 'DecodingError', 'IllFormedError', 'InvalidError',
     'BadInitialByteError', 'MisplacedBreakError', 'BadSimpleError', 'UnexpectedEOFError',
@@ -345,6 +345,80 @@ class FrozenOrderedDict(FrozenDict):
     dict_class = OrderedDict
 
 
+class RawCBOR:
+    '''An already-encoded CBOR data item that the encoder writes verbatim, so that it need
+    not be decoded and re-encoded.
+
+    If validate is True the encoding is checked to be a single well-formed data item by
+    skipping over it, without decoding it.
+    '''
+
+    __slots__ = ('encoding', )
+
+    def __init__(self, encoding, validate=False):
+        encoding = bytes(encoding)
+        if validate:
+            from cborx.decoder import item_extent
+
+            _start, end = item_extent(encoding)
+            if end != len(encoding):
+                raise UnconsumedDataError(f'{len(encoding) - end:,d} bytes follow the '
+                                          f'encoded data item')
+        self.encoding = encoding
+
+    def decode(self, **kwargs):
+        '''Return the decoded data item.
+
+        kwargs: arguments to pass to CBORDecoder
+        '''
+        from cborx.decoder import loads
+
+        return loads(self.encoding, **kwargs)
+
+    def __eq__(self, other):
+        if other.__class__ is not self.__class__:
+            return NotImplemented
+        return self.encoding == other.encoding
+
+    def __hash__(self):
+        return hash(self.encoding)
+
+    def __repr__(self):
+        return f'{self.__class__.__name__}({self.encoding!r})'
+
+
+# The value of an EmbeddedCBOR before it is decoded
+not_decoded = object()
+
+
+class EmbeddedCBOR(RawCBOR):
+    '''A CBOR data item embedded in a byte string (tag 24).
+
+    CBORDecoder returns these for tag 24 without decoding the payload; it is decoded with
+    the decoder's options when value is first accessed.  The stream decoders do not
+    interpret tags, and return tag 24 as a CBORTag.
+
+    options: arguments to pass to CBORDecoder when decoding value
+    '''
+
+    __slots__ = ('_value', '_options')
+
+    def __init__(self, encoding, validate=False, options=None):
+        super().__init__(encoding, validate)
+        self._value = not_decoded
+        self._options = options or {}
+
+    @property
+    def value(self):
+        '''The embedded data item, decoded on first access.'''
+        if self._value is not_decoded:
+            self._value = self.decode(**self._options)
+        return self._value
+
+    def __encode_cbor__(self, encoder):
+        return b'\xd8\x18' + pack_cbor_length(len(self.encoding), 0x40) + self.encoding
+
+
 def _bytes_diagnostic(item):
     return f"h'{item.hex()}'"
 
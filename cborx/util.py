@@ -26,6 +26,8 @@
 '''Utility functions'''
 
 import re
+import struct
+import sys
 from array import array
 from datetime import datetime, date, timezone, time, timedelta
 
@@ -71,6 +73,70 @@ def raise_error(exception_obj):
     raise exception_obj
 
 
+def _frozen_option(value):
+    '''Return value as an immutable equivalent, and a hashable form of it.'''
+    if isinstance(value, (set, frozenset)):
+        value = frozenset(value)
+        return value, value
+    if isinstance(value, dict):
+        value = dict(value)
+        return value, frozenset(value.items())
+    if isinstance(value, list):
+        value = tuple(value)
+    return value, value
+
+
+class CodecPool:
+    '''A process-wide pool of idle encoders or decoders keyed by their constructor options.
+
+    Reusing an instance keeps its dispatch and tag caches warm.  An instance is removed from
+    the pool while in use so that nested and concurrent calls each get their own.  Options
+    that cannot be hashed are not pooled.
+    '''
+
+    max_idle = 4
+    max_keys = 64
+
+    def __init__(self, cls):
+        self._cls = cls
+        self._idle = {}
+
+    def acquire(self, args, kwargs):
+        '''Return a (key, instance) pair.  The instance is reset with args.'''
+        options = {}
+        key_parts = []
+        try:
+            for name, value in kwargs.items():
+                options[name], hashable = _frozen_option(value)
+                key_parts.append((name, hashable))
+            key = frozenset(key_parts)
+            idle = self._idle.get(key)
+        except TypeError:
+            return None, self._cls(*args, **kwargs)
+        if idle:
+            try:
+                instance = idle.pop()
+            except IndexError:
+                pass
+            else:
+                instance.reset(*args)
+                return key, instance
+        return key, self._cls(*args, **options)
+
+    def release(self, key, instance):
+        '''Return an instance obtained from acquire() to the pool.'''
+        if key is None:
+            return
+        idle = self._idle.get(key)
+        if idle is None:
+            if len(self._idle) >= self.max_keys:
+                return
+            idle = self._idle.setdefault(key, [])
+        if len(idle) < self.max_idle:
+            instance.reset()
+            idle.append(instance)
+
+
 def _analyze_array_tags(base_tag_value):
     '''Determine dynamically for the host machine a map from Python typecodes to tag values,
     and from tag values to decoder instructions.
@@ -123,3 +189,23 @@ def _analyze_array_tags(base_tag_value):
     return decoder_hints, typecode_tag_values
 
 typed_array_decoder_hints, typecode_to_tag_map = _analyze_array_tags(64)
+
+
+def buffer_format_to_tag(fmt):
+    '''Return the RFC 8746 typed array tag for elements with the struct format string fmt, as
+    found in memoryview.format, or None if there is none.'''
+    if fmt[0] in '@=<>!':
+        byteorder, code = fmt[0], fmt[1:]
+    else:
+        byteorder, code = '@', fmt
+    if len(code) != 1 or code not in 'bBhHiIlLqQefd':
+        return None
+    size = struct.calcsize(fmt)
+    if byteorder in '<>!':
+        is_le = byteorder == '<'
+    else:
+        is_le = sys.byteorder == 'little'
+    if code in 'efd':
+        return 80 + (size.bit_length() - 2) + (4 if is_le else 0)
+    return (64 + (size.bit_length() - 1) + (8 if code.islower() else 0) +
+            (4 if is_le and size > 1 else 0))
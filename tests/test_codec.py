@@ -0,0 +1,122 @@
+from dataclasses import dataclass, field
+from typing import NamedTuple
+
+import attr
+import pytest
+
+from cborx import *
+
+
+@dataclass
+class Point:
+    x: int
+    y: int
+    label: str = ''
+    area: float = field(init=False, default=0.0)
+
+
+@attr.s
+class Reading:
+    sensor = attr.ib()
+    _value = attr.ib()
+    units = attr.ib(default='C')
+
+
+class Pair(NamedTuple):
+    first: object
+    second: object
+
+
+class Empty(NamedTuple):
+    pass
+
+
+@dataclass
+class Single:
+    value: int
+
+
+@dataclass(frozen=True)
+class Frozen:
+    side: int
+    area: int = field(init=False, default=0)
+
+
+@attr.s(frozen=True, slots=True)
+class FrozenReading:
+    sensor = attr.ib()
+    _total = attr.ib(init=False, default=0)
+
+
+values = [Point(1, -2, 'a'), Reading('t1', 21.5), Pair([1, 2], {'a': None}), Empty(),
+          Single(7)]
+
+
+def as_dict(value, codec):
+    return {name: getattr(value, name) for name in codec.field_names}
+
+
+@pytest.mark.parametrize('value', values)
+@pytest.mark.parametrize('sort_method', list(SortMethod))
+def test_codec_encoding(value, sort_method):
+    codec = codec_for(type(value))
+    encoding = dumps(value, codecs=[codec], sort_method=sort_method)
+    assert encoding == dumps(as_dict(value, codec), sort_method=sort_method)
+    assert CBOREncoder(codecs=[codec], sort_method=sort_method).encode_item(value) == encoding
+    assert codec.from_mapping(loads(encoding)) == value
+
+
+@pytest.mark.parametrize('value', values)
+def test_codec_tagged(value):
+    codec = codec_for(type(value), tag=1000)
+    encoding = dumps([value, value], codecs=[codec])
+    assert encoding[1:4] == bytes.fromhex('d903e8')
+    assert loads(encoding, codecs=[codec]) == [value, value]
+    assert loads(encoding) == [CBORTag(1000, as_dict(value, codec))] * 2
+
+
+def test_codec_shared():
+    codec = codec_for(Point, tag=1000)
+    point = Point(1, 2)
+    encoding = dumps([point, point], codecs=[codec], shared_types={Point})
+    assert encoding.hex().startswith('82d81cd903e8')
+    result = loads(encoding, codecs=[codec])
+    assert result == [point, point] and result[0] is result[1]
+
+
+def test_codec_streaming():
+    codec = codec_for(Pair)
+    value = [Pair(n, str(n)) for n in range(1000)]
+    chunks = list(CBOREncoder(codecs=[codec]).iterencode(value, chunk_size=100))
+    assert b''.join(chunks) == dumps([{'first': n, 'second': str(n)} for n in range(1000)])
+
+
+def test_codec_non_init_fields():
+    point = Point(1, 2)
+    point.area = 9.5
+    frozen = Frozen(3)
+    object.__setattr__(frozen, 'area', 9)
+    reading = FrozenReading('t1')
+    object.__setattr__(reading, '_total', 5)
+    for value in (point, frozen, reading):
+        codec = codec_for(type(value), tag=1000)
+        result = loads(dumps(value, codecs=[codec]), codecs=[codec])
+        assert result == value
+        assert as_dict(result, codec) == as_dict(value, codec)
+
+
+def test_codec_for_bad():
+    with pytest.raises(TypeError):
+        codec_for(dict)
+    with pytest.raises(TypeError):
+        codec_for(Point(1, 2))
+
+
+def test_codec_decode_bad():
+    codec = codec_for(Point, tag=1000)
+    with pytest.raises(ValueError):
+        loads(b'', codecs=[codec_for(Point)])
+    with pytest.raises(TagError, match='must wrap a map'):
+        loads(dumps(CBORTag(1000, [1, 2])), codecs=[codec])
+    with pytest.raises(TagError, match='invalid Point record'):
+        loads(dumps(CBORTag(1000, {'x': 1, 'z': 2})), codecs=[codec])
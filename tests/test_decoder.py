@@ -4,12 +4,20 @@ from io import BytesIO
 from itertools import count, takewhile
 from random import randrange
 import math
+import mmap
 import re
+import sys
+from uuid import UUID
 
 import pytest
 
 from cborx import *
 
+
+def load_bytes(raw, **kwargs):
+    return load(BytesIO(raw), **kwargs)
+
+
 #
 # Helpers for async streaming tests
 #
@@ -308,6 +316,7 @@ truncated_encodings = (
     'bf',   'bf00', 'bf0000',  # missing break
     'd8', 'd900', 'da000000', 'db00000000000000',  # value truncated
     'f8',  # missing simple value
+    'f9', 'f93e', 'fa3fc000', 'fb3ff80000000000',  # float truncated
 )
 
 misplaced_breaks = (
@@ -595,6 +604,7 @@ def test_bad_il_byte_string(encoding):
     ('d81d60', 'shared reference must be an integer'),
     ('d81d80', 'shared reference must be an integer'),
     ('d845820102', 'typed array must be encoded as a byte string'),
+    ('d81863666f6f', "embedded CBOR must be encoded as a byte string, not 'foo'"),
 ])
 def test_tagged_type_error(encoding, match):
     with pytest.raises(TagError, match=match):
@@ -660,12 +670,102 @@ def test_typed_arrays(encoding, expected):
         assert list(result) == expected
 
 
+@pytest.mark.parametrize("loads", [loads, load_bytes])
+@pytest.mark.parametrize("typecode", 'BhIqfd')
+def test_typed_array_memoryview(loads, typecode):
+    values = array(typecode, [1, 2, 3, 250])
+    encoding = dumps(values)
+    result = loads(encoding, typed_array_style=TypedArrayStyle.MEMORYVIEW)
+    assert isinstance(result, memoryview)
+    assert result.format == typecode
+    assert result.tolist() == values.tolist()
+    if loads is load_bytes:
+        return
+    # A view of the input
+    assert result.obj is encoding
+    # Indefinite-length byte strings are joined
+    payload = values.tobytes()
+    il_encoding = encoding[:2] + b'\x5f' + dumps(payload[:3]) + dumps(payload[3:]) + b'\xff'
+    assert loads(il_encoding, typed_array_style=TypedArrayStyle.MEMORYVIEW) == result
+
+
+@pytest.mark.parametrize("style", [TypedArrayStyle.ARRAY, TypedArrayStyle.MEMORYVIEW])
+def test_typed_array_memoryview_non_native(style):
+    # uint32 in non-native byte order is copied to an array
+    tag_value = 66 if sys.byteorder == 'little' else 70
+    encoding = dumps(CBORTag(tag_value, bytes(range(8))))
+    result = loads(encoding, typed_array_style=style)
+    assert isinstance(result, array)
+    assert result.tobytes() == bytes([3, 2, 1, 0, 7, 6, 5, 4])
+
+
+@pytest.mark.parametrize("encoding", ['d8524101', 'd8528101', 'd8525f41004100ff'])
+def test_typed_array_memoryview_bad(encoding):
+    with pytest.raises((TagError, ValueError)):
+        loads(bytes.fromhex(encoding), typed_array_style=TypedArrayStyle.MEMORYVIEW)
+
+
+def test_typed_array_numpy():
+    numpy = pytest.importorskip('numpy')
+    values = array('d', [1.5, -2.25, math.inf])
+    encoding = dumps(values)
+    result = loads(encoding, typed_array_style=TypedArrayStyle.NUMPY)
+    assert isinstance(result, numpy.ndarray)
+    assert result.tolist() == values.tolist()
+    assert not result.flags.owndata
+    values.byteswap()
+    swapped = encoding[:2] + bytes([encoding[2] ^ 4]) + encoding[3:4] + values.tobytes()
+    result = loads(swapped, typed_array_style=TypedArrayStyle.NUMPY)
+    assert not result.dtype.isnative
+    assert result.tolist() == [1.5, -2.25, math.inf]
+
+
 def test_invalid_regexp():
     encoding = 'd823625b5d'
     with pytest.raises(re.error):
         loads(bytes.fromhex(encoding))
 
 
+@pytest.mark.parametrize('encoding, expected', [
+    ('d81840', b''),
+    ('d818456449455446', b'dIETF'),
+    ('d8185f41644449455446ff', b'dIETF'),
+    # The payload is not decoded until accessed
+    ('d81841ff', b'\xff'),
+])
+def test_embedded_cbor(encoding, expected):
+    embedded = loads(bytes.fromhex(encoding))
+    assert isinstance(embedded, EmbeddedCBOR)
+    assert embedded.encoding == expected
+
+
+def test_embedded_cbor_lazy():
+    embedded = loads(dumps([EmbeddedCBOR(dumps({'a': [1, 2]})), EmbeddedCBOR(b'\x1c')]))
+    assert embedded[0].value == {'a': [1, 2]}
+    with pytest.raises(BadInitialByteError):
+        embedded[1].value
+    assert embedded[1].encoding == b'\x1c'
+
+
+@pytest.mark.parametrize('kwargs, payload, expected', [
+    ({}, 'c240', 0),
+    ({'retain_bignums': True}, 'c240', BigNum(0)),
+    ({'string_errors': 'replace'}, '61ff', '\ufffd'),
+    ({'tag_decoders': {99: lambda decoder, tag_value: (tag_value, decoder.decode_item())}},
+     'd86300', (99, 0)),
+])
+def test_embedded_cbor_options(kwargs, payload, expected):
+    embedded = loads(dumps(EmbeddedCBOR(bytes.fromhex(payload))), **kwargs)
+    assert embedded.value == expected
+    assert type(embedded.value) is type(expected)
+
+
+def test_embedded_cbor_byte_string_type():
+    embedded = loads(dumps(EmbeddedCBOR(dumps(bytes(300)))), byte_string_type=memoryview)
+    assert isinstance(embedded.encoding, bytes)
+    assert isinstance(embedded.value, memoryview)
+
+
 def test_unknown_tag():
     encoding = 'd9032063746167'  # Unknown tag 800 with payload text string "tag"
     value = loads(bytes.fromhex(encoding))
@@ -925,3 +1025,233 @@ def test_load_sequence():
     assert next(gen) == 0
     assert next(gen) == [3]
     assert next(gen) == 1
+
+
+def test_buffer_decoder_mmap(tmp_path):
+    path = tmp_path / 'seq.cbor'
+    path.write_bytes(bytes.fromhex('8301021821 6449455446 5a00000001'))
+    with open(path, 'rb') as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            items = CBORBufferDecoder(mm).decode_sequence()
+            assert next(items) == [1, 2, 33]
+            assert next(items) == 'IETF'
+            with pytest.raises(UnexpectedEOFError, match='need 1 bytes but only 0 available'):
+                next(items)
+
+
+@pytest.mark.parametrize("cls", [bytes, bytearray, memoryview])
+def test_loads_sequence_buffer(cls):
+    encoding = cls(bytes.fromhex('01 826161a161626163 4401020304'))
+    assert list(loads_sequence(encoding)) == [1, ['a', {'b': 'c'}], bytes.fromhex('01020304')]
+
+
+def test_decoder_reset():
+    decoder = CBORBufferDecoder(bytes.fromhex('82d81c63626172d81d00'), retain_bignums=True)
+    assert decoder.decode() == ['bar', 'bar']
+    decoder.reset(bytes.fromhex('d81d00'))
+    with pytest.raises(TagError, match='non-existent shared reference'):
+        decoder.decode()
+    decoder.reset(bytes.fromhex('c240'))
+    assert decoder.decode() == BigNum(0)
+
+
+@pytest.mark.parametrize("encoding",
+                         [test[0] for test in singleton_tests + tag_tests],
+                         ids = [test[2] for test in singleton_tests + tag_tests])
+def test_skip_item(encoding):
+    encoding = bytes.fromhex(encoding)
+    decoder = CBORBufferDecoder(encoding + b'\x01')
+    decoder.skip_item()
+    assert decoder.decode_item() == 1
+
+
+@pytest.mark.parametrize("encoding, exception",
+                         [(test[0], test[1]) for test in ill_formed_tests],
+                         ids = [test[2] for test in ill_formed_tests])
+def test_skip_item_ill_formed(encoding, exception):
+    with pytest.raises(exception):
+        CBORBufferDecoder(bytes.fromhex(encoding)).skip_item()
+
+
+archive = {
+    'records': [{'id': n, 'payload': bytes([n]) * n, 'meta': {'n': n}} for n in range(20)],
+    'ordered': OrderedDict(b=[1, 2], a=3),
+    (1, 2): 'tuple key',
+}
+
+
+@pytest.mark.parametrize("path, expected", [
+    ((), archive),
+    (('records', 17, 'payload'), bytes([17]) * 17),
+    (('records', -1, 'meta'), {'n': 19}),
+    (('ordered', 'b', 1), 2),
+    (((1, 2), ), 'tuple key'),
+])
+def test_loads_path(path, expected):
+    assert loads_path(dumps(archive), path) == expected
+
+
+def test_loads_path_memoryview():
+    encoding = dumps(archive)
+    result = loads_path(encoding, ('records', 3), as_memoryview=True)
+    assert isinstance(result, memoryview)
+    assert loads(result) == archive['records'][3]
+
+
+@pytest.mark.parametrize("encoding, path, expected", [
+    ('9f018202039f0405ffff', (2, 1), 5),
+    ('9f018202039f0405ffff', (-2, 0), 2),
+    ('bf61610161629f0203ffff', ('b', 1), 3),
+])
+def test_loads_path_indefinite_length(encoding, path, expected):
+    assert loads_path(bytes.fromhex(encoding), path) == expected
+
+
+@pytest.mark.parametrize("path, exception", [
+    (('missing', ), KeyError),
+    (('records', 20), IndexError),
+    (('records', 'id'), TypeError),
+    (('records', 0, 'id', 0), TypeError),
+])
+def test_loads_path_missing(path, exception):
+    with pytest.raises(exception):
+        loads_path(dumps(archive), path)
+
+
+def test_item_extent():
+    encoding = bytes.fromhex('01 5a00000004 01020304 83 01 02 03')
+    assert item_extent(encoding) == (0, 1)
+    assert item_extent(encoding, 1) == (1, 10)
+    assert item_extent(encoding, 10) == (10, 14)
+
+
+def test_load_mmap(tmp_path):
+    path = tmp_path / 'doc.cbor'
+    path.write_bytes(dumps(archive))
+    assert load_mmap(path) == archive
+    path.write_bytes(b'')
+    with pytest.raises(UnexpectedEOFError):
+        load_mmap(path)
+
+
+def test_load_sequence_mmap(tmp_path):
+    path = tmp_path / 'seq.cbor'
+    items = [n * 'x' for n in range(100)] + [archive]
+    path.write_bytes(b''.join(dumps(item) for item in items))
+    assert list(load_sequence_mmap(path)) == items
+    path.write_bytes(b'')
+    assert list(load_sequence_mmap(path)) == []
+
+
+@pytest.mark.parametrize("cls", [bytes, bytearray, memoryview])
+def test_byte_string_views(cls):
+    big, small = bytes(range(256)) * 2, b'small'
+    value = [big, small, {big: big}, 1 << 4000, UUID(bytes=bytes(16)), {big}]
+    encoding = cls(dumps(value))
+    result = loads(encoding, byte_string_type=memoryview)
+    assert result == value
+    assert isinstance(result[0], memoryview) and result[0].obj is memoryview(encoding).obj
+    assert isinstance(result[1], bytes)
+    key, kvalue = list(result[2].items())[0]
+    assert isinstance(key, bytes) and isinstance(kvalue, memoryview)
+    assert all(isinstance(member, bytes) for member in result[5])
+    result = loads(encoding, byte_string_type=memoryview, min_view_length=0)
+    assert isinstance(result[1], memoryview)
+
+
+def test_byte_string_views_keep_buffer_alive():
+    encoding = bytearray(dumps([bytes(1000)]))
+    view = loads(encoding, byte_string_type=memoryview)[0]
+    del encoding
+    assert view == bytes(1000)
+
+
+def test_byte_string_views_il():
+    result = loads(bytes.fromhex('5f 4474686520 4a666f78206a756d706564 ff'),
+                   byte_string_type=memoryview, min_view_length=0)
+    assert result == b'the fox jumped'
+    assert isinstance(result, bytes)
+
+
+def test_byte_string_views_stream():
+    result = load(BytesIO(dumps(bytes(300))), byte_string_type=memoryview)
+    assert isinstance(result, memoryview) and result == bytes(300)
+
+
+def test_byte_string_type_bad():
+    with pytest.raises(ValueError):
+        loads(b'\x40', byte_string_type=str)
+
+
+def test_load_mmap_views(tmp_path):
+    path = tmp_path / 'doc.cbor'
+    path.write_bytes(dumps(['x', bytes(1000)]))
+    result = load_mmap(path, byte_string_type=memoryview)
+    assert isinstance(result[1], memoryview) and result[1] == bytes(1000)
+
+
+@pytest.mark.parametrize("loads", [loads, load_bytes])
+def test_string_cache(loads):
+    records = [{'name': f'record {n % 3}', 'kind': 'widget', 'k' * 100: 1} for n in range(10)]
+    encoding = dumps(records)
+    result = loads(encoding, string_cache_size=100)
+    assert result == records
+    keys = [list(record) for record in result]
+    # Keys are sorted length-first; the last is too long to be cached
+    assert all(record_keys[:2] == keys[0][:2] for record_keys in keys)
+    assert all(a is b for record_keys in keys for a, b in zip(record_keys[:2], keys[0]))
+    assert keys[0][1] is sys.intern('name')
+    assert keys[0][2] is not keys[1][2]
+    # Values are not cached by default
+    assert result[0]['kind'] is not result[1]['kind']
+    result = loads(encoding, string_cache_size=100, max_cached_value_length=6)
+    assert result[0]['kind'] is result[1]['kind']
+    assert result[0]['name'] is not result[3]['name']
+
+
+@pytest.mark.parametrize("loads", [loads, load_bytes])
+def test_string_cache_bounded(loads):
+    decoder_keys = [f'key{n}' for n in range(50)]
+    encoding = dumps([{key: 0} for key in decoder_keys] * 2)
+    assert loads(encoding, string_cache_size=10) == [{key: 0} for key in decoder_keys] * 2
+    decoder = CBORBufferDecoder(encoding, string_cache_size=10)
+    decoder.decode()
+    assert 0 < len(decoder._string_cache) <= 10
+    decoder.reset(encoding)
+    assert decoder._string_cache
+
+
+def test_string_cache_errors():
+    encoding = bytes.fromhex('a262ff610162ff6202')
+    with pytest.raises(StringEncodingError):
+        loads(encoding, string_cache_size=10)
+    result = loads(encoding, string_cache_size=10, string_errors='replace')
+    assert result == {'\ufffda': 1, '\ufffdb': 2}
+
+
+@pytest.mark.parametrize("encoding, expected", [
+    ('880001020304050617', [0, 1, 2, 3, 4, 5, 6, 23]),
+    ('9818' + '00' * 24, [0] * 24),
+    ('8800010203040506181f', [0, 1, 2, 3, 4, 5, 6, 31]),
+    ('880001020304050620', [0, 1, 2, 3, 4, 5, 6, -1]),
+    ('a1880001020304050607f6', {(0, 1, 2, 3, 4, 5, 6, 7): None}),
+    ('82d81c880001020304050607d81d00', [[0, 1, 2, 3, 4, 5, 6, 7]] * 2),
+    # Empty arrays with non-minimal lengths
+    ('8298000a', [[], 10]),
+    ('8299000001', [[], 1]),
+    ('829a0000000017', [[], 23]),
+    ('829b000000000000000000', [[], 0]),
+    ('98030a0b0c', [10, 11, 12]),
+])
+@pytest.mark.parametrize("loads", [loads, load_bytes])
+def test_bulk_small_ints(loads, encoding, expected):
+    result = loads(bytes.fromhex(encoding))
+    assert result == expected
+    if encoding.startswith('82d81c'):
+        assert result[0] is result[1]
+
+
+@pytest.mark.parametrize("encoding", ['880001020304050607'[:n] for n in (4, 16)])
+def test_bulk_small_ints_truncated(encoding):
+    with pytest.raises(UnexpectedEOFError):
+        loads(bytes.fromhex(encoding))
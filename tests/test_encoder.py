@@ -1,4 +1,6 @@
+import ctypes
 import math
+import mmap
 from array import array
 from collections import namedtuple, defaultdict, Counter, OrderedDict
 from datetime import datetime, timedelta, timezone, date
@@ -9,11 +11,13 @@ from io import BytesIO
 from ipaddress import IPv4Address, IPv6Address, IPv4Network, IPv6Network
 from uuid import UUID
 import re
+import socket
+import sys
 
 import pytest
 
 from cborx import *
-from cborx.packing import pack_byte, pack_be_uint16, pack_be_uint32
+from cborx.packing import pack_byte, pack_be_uint16, pack_be_uint32, pack_cbor_length
 
 
 @pytest.mark.parametrize("value, encoding", (
@@ -360,6 +364,62 @@ def test_array_fail():
         dumps(a)
 
 
+@pytest.mark.parametrize('value, expected', [
+    (array('h', [-400, 400]), 'd84d4470fe9001'),
+    (array('d', [-1.5, 3.25]), 'd85650000000000000f8bf0000000000000a40'),
+    (memoryview(bytes.fromhex('0000c0bf')).cast('f'), 'd855440000c0bf'),
+    (memoryview(bytes.fromhex('3c00c000')).cast('H'), 'd845443c00c000'),
+    (memoryview(bytes.fromhex('3c00c000')).cast('b'), 'd848443c00c000'),
+    (memoryview(bytes(range(6))).cast('B', [2, 3]), 'd82882820203d84046000102030405'),
+    (memoryview(bytes(range(12))).cast('h', [3, 2]),
+     'd82882820302d84d4c000102030405060708090a0b'),
+    (memoryview(bytes(range(6)))[::2], '43000204'),
+    (memoryview(bytes(range(8))).cast('h')[::2], 'd84d4400010405'),
+], ids=[
+    'h array', 'd array', 'f', 'H', 'b', '2D B', '2D h', 'strided B', 'strided h',
+])
+@pytest.mark.skipif(sys.byteorder != 'little', reason='little-endian encodings')
+def test_buffer_encodings(value, expected):
+    assert dumps(value).hex() == expected
+    # Writers match encoders
+    assert CBOREncoder().encode_item(value).hex() == expected
+    assert dumps([value]).hex() == '81' + expected
+
+
+@pytest.mark.parametrize('value', [
+    memoryview(b'abcd').cast('c'),
+    memoryview((ctypes.c_ubyte * 4).from_buffer_copy(b'abcd')),
+    memoryview((ctypes.c_char * 4).from_buffer_copy(b'abcd')),
+])
+def test_buffer_byte_formats(value):
+    assert dumps(value) == dumps(b'abcd')
+    assert dumps(value[::2]) == dumps(b'ac')
+
+
+def test_buffer_fail():
+    with pytest.raises(EncodingError, match='cannot encode buffers with format'):
+        dumps(memoryview(b'abcd').cast('?'))
+    with pytest.raises(EncodingError, match='cannot encode buffers with format'):
+        dumps(memoryview(b'abcd').cast('c', (2, 2)))
+
+
+def test_buffer_object():
+    mapping = mmap.mmap(-1, 4)
+    mapping.write(b'abcd')
+    assert dumps(mapping) == dumps(b'abcd')
+
+
+def test_numpy_arrays():
+    numpy = pytest.importorskip('numpy')
+    value = numpy.arange(6, dtype='<i4').reshape(2, 3)
+    assert loads(dumps(value)) == CBORTag(40, [[2, 3], array('i', range(6))])
+    value = numpy.array([1.5, 2.5], dtype='>f8')
+    assert dumps(value) == dumps(CBORTag(82, value.tobytes()))
+    assert dumps(value[::-1]) == dumps(CBORTag(82, value[::-1].tobytes()))
+    with pytest.raises(EncodingError):
+        dumps(numpy.array([True]))
+
+
 @pytest.mark.parametrize('value, expected', [
     (CBORSimple(0), 'e0'),
     (CBORSimple(32), 'f820'),
@@ -502,3 +562,734 @@ def test_dump():
     obj = BytesIO()
     dump('IETF', obj)
     assert obj.getvalue().hex() == '6449455446'
+
+
+@pytest.mark.parametrize('value', [
+    [1, -500, 1 << 70, -(1 << 70), b'foo', bytearray(b'bar'), 'baz', 1.5, True, None],
+    {'b': [1, {2: 3}], 'a': (4, 5), 6: OrderedDict([(7, 8)]), (9, ): {10, 11}},
+    defaultdict(list, {'x': [CBORTag(99, {'y': 'z'})]}),
+    [namedtuple('nt', 'a b')(1, 2), Counter(cats=3), SortMethod.LENGTH_FIRST],
+    [[[[[[[[[[[]]]]]]]]]]],
+])
+@pytest.mark.parametrize('kwargs', [
+    {}, {'sort_method': SortMethod.UNSORTED}, {'shared_types': {list, str}},
+])
+def test_encode_matches_encode_item(value, kwargs):
+    assert CBOREncoder(**kwargs).encode(value) == CBOREncoder(**kwargs).encode_item(value)
+
+
+class Reentrant:
+    def __encode_cbor__(self, encoder):
+        return encoder.encode('inner')
+
+
+def test_encode_reentrant():
+    assert dumps([Reentrant(), 1]) == dumps(['inner', 1])
+
+
+@pytest.mark.parametrize('sort_method', list(SortMethod))
+def test_iterencode(sort_method):
+    value = [{'key': n, 'values': [n, str(n), {'a': [b'x' * n]}]} for n in range(2000)]
+    value.append(OrderedDict(b=[1.5], a=None))
+    encoder = CBOREncoder(sort_method=sort_method)
+    chunks = list(encoder.iterencode(value, chunk_size=1000))
+    assert len(chunks) > 10
+    assert all(len(chunk) < 1000 + 2010 for chunk in chunks)
+    assert b''.join(chunks) == dumps(value, sort_method=sort_method)
+
+
+@pytest.mark.parametrize('value, slack', [
+    ([[]] * 100000, 10), ([{}] * 100000, 10), ([[[[]]]] * 20000, 10),
+    # Members that are not containers are written by the container's walker
+    ([['x' * 100] * 1000], 110),
+    ({'a': OrderedDict((str(n), 'x' * 100) for n in range(1000))}, 110),
+])
+def test_iterencode_containers(value, slack):
+    chunks = list(CBOREncoder().iterencode(value, chunk_size=1024))
+    assert max(len(chunk) for chunk in chunks) < 1024 + slack
+    assert b''.join(chunks) == dumps(value)
+
+
+@pytest.mark.parametrize('value', [0, 'IETF', [], {}])
+def test_iterencode_small(value):
+    assert list(CBOREncoder().iterencode(value)) == [dumps(value)]
+
+
+def test_iterencode_recursive_fail():
+    a = [1, 2]
+    a.append(a)
+    with pytest.raises(EncodingError, match='self-referential object detected'):
+        list(CBOREncoder().iterencode(a))
+
+
+class ChunkRecorder:
+
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, chunk):
+        self.chunks.append(chunk)
+
+
+def test_dump_chunked():
+    value = [[n, str(n)] for n in range(10000)]
+    fp = ChunkRecorder()
+    dump(value, fp, chunk_size=4096)
+    assert len(fp.chunks) > 1
+    assert b''.join(fp.chunks) == dumps(value)
+
+
+@pytest.mark.parametrize('value', [
+    b'',
+    b'x' * 100,
+    [b'a' * 5000, 'b', b'c' * 9000, bytearray(b'd' * 20000), 1],
+    {'key': b'v' * 10000, 'other': [b'w' * 3000] * 3},
+    array('d', range(2000)),
+    [[n, b'p' * n] for n in range(0, 6000, 1000)],
+])
+@pytest.mark.parametrize('min_segment_length', [0, 1, 4096, 1 << 20])
+def test_encode_segments(value, min_segment_length):
+    segments = CBOREncoder().encode_segments(value, min_segment_length)
+    assert b''.join(segments) == dumps(value)
+
+
+def test_encode_segments_references_payloads():
+    payload = b'z' * 100000
+    segments = CBOREncoder().encode_segments([1, payload, 2])
+    assert len(segments) == 3
+    assert segments[1] is payload
+    assert b''.join(segments) == dumps([1, payload, 2])
+
+
+def test_encode_segments_reentrant():
+    payload = b'y' * 10000
+
+    class Inner:
+        def __encode_cbor__(self, encoder):
+            return encoder.encode(payload)
+
+    value = [payload, Inner(), payload]
+    segments = CBOREncoder().encode_segments(value, 1000)
+    assert b''.join(segments) == dumps(value)
+    assert sum(segment is payload for segment in segments) == 2
+
+
+def test_itersegments_chunked():
+    value = [[n, bytes(n % 2000)] for n in range(5000)]
+    parts = list(CBOREncoder().itersegments(value, 4096, 1000))
+    assert len(parts) > 1
+    assert b''.join(b''.join(segments) for segments in parts) == dumps(value)
+
+
+class PartialWriter:
+    def __init__(self, limit):
+        self.limit = limit
+        self.calls = []
+        self.data = bytearray()
+
+    def writev(self, buffers):
+        self.calls.append(len(buffers))
+        count = 0
+        for buffer in buffers:
+            part = bytes(buffer[:self.limit - count])
+            self.data += part
+            count += len(part)
+            if count == self.limit:
+                break
+        return count
+
+
+@pytest.mark.parametrize('limit', [1, 7, 1000, 1 << 30])
+def test_write_vectored_partial_writes(limit):
+    from cborx.encoder import write_vectored
+
+    segments = [b'ab', b'', bytes(range(256)) * 10, bytearray(b'cd'), memoryview(b'efg')]
+    writer = PartialWriter(limit)
+    write_vectored(writer.writev, segments)
+    assert writer.data == b''.join(segments)
+
+
+def test_write_vectored_batches():
+    from cborx.encoder import MAX_IOVECS, write_vectored
+
+    segments = [bytes([n % 256]) for n in range(MAX_IOVECS * 2 + 5)]
+    writer = PartialWriter(1 << 30)
+    write_vectored(writer.writev, segments)
+    assert writer.data == b''.join(segments)
+    assert writer.calls == [MAX_IOVECS, MAX_IOVECS, 5]
+
+
+def test_write_vectored_no_progress():
+    from cborx.encoder import write_vectored
+
+    with pytest.raises(OSError):
+        write_vectored(lambda buffers: 0, [b'abc'])
+    # Nothing to write
+    write_vectored(lambda buffers: 0, [b'', bytearray()])
+
+
+def test_dump_ssl_socket():
+    ssl = pytest.importorskip('ssl')
+
+    class FakeSSLSocket(ssl.SSLSocket):
+        # SSLSocket cannot be constructed directly
+        def __new__(cls):
+            return socket.socket.__new__(cls)
+
+        def __init__(self):
+            self.sent = []
+
+        def sendall(self, data):
+            self.sent.append(bytes(data))
+
+        def sendmsg(self, *args):
+            raise NotImplementedError
+
+    value = [b'x' * 20000, 'y', b'z' * 10000]
+    fp = FakeSSLSocket()
+    dump(value, fp, min_segment_length=1000)
+    assert b''.join(fp.sent) == dumps(value)
+    assert len(fp.sent) > 1
+
+
+def test_dump_file_io(tmp_path):
+    value = [b'a' * 20000, list(range(1000)), b'b' * 50000, 'c' * 10000]
+    path = tmp_path / 'out.cbor'
+    with open(path, 'wb', buffering=0) as f:
+        dump(value, f, chunk_size=1024)
+    assert path.read_bytes() == dumps(value)
+
+
+def test_dump_socket():
+    import socket
+    import threading
+
+    value = {'data': [b'x' * 100000, bytes(range(256)) * 400], 'n': list(range(3000))}
+    expected = dumps(value)
+    left, right = socket.socketpair()
+    received = bytearray()
+
+    def receive():
+        while len(received) < len(expected):
+            received.extend(right.recv(65536))
+
+    thread = threading.Thread(target=receive)
+    thread.start()
+    try:
+        dump(value, left)
+    finally:
+        thread.join()
+        left.close()
+        right.close()
+    assert received == expected
+
+
+class StreamRecorder:
+    '''Stands in for an asyncio.StreamWriter.'''
+
+    def __init__(self):
+        self.chunks = []
+        self.drained = []
+        self.closed = False
+
+    def write(self, data):
+        self.chunks.append(data)
+
+    async def drain(self):
+        self.drained.append(sum(len(chunk) for chunk in self.chunks))
+
+    def close(self):
+        self.closed = True
+
+    async def wait_closed(self):
+        pass
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize('value', [
+    'IETF',
+    [[n, str(n)] for n in range(10000)],
+    {'data': b'x' * 100000, 'n': list(range(3000))},
+])
+async def test_adump_astreaming(value):
+    writer = StreamRecorder()
+    await adump(value, writer, chunk_size=4096, high_water=10000)
+    assert b''.join(writer.chunks) == dumps(value)
+    assert writer.drained[-1] == len(dumps(value))
+    # Never more than high_water plus a chunk written without draining
+    flushed = [0] + writer.drained
+    assert all(b - a < 10000 + 4096 + 100000 for a, b in zip(flushed, flushed[1:]))
+    if len(writer.chunks) > 3:
+        assert len(writer.drained) > 1
+
+
+@pytest.mark.asyncio
+async def test_async_sequence_writer_astreaming():
+    values = [{'a': [1, 2]}, 'b' * 5000, [list(range(100))] * 50]
+    writer = StreamRecorder()
+    async with AsyncSequenceWriter(writer, chunk_size=1024, high_water=4096,
+                                   shared_types={list}) as sequence_writer:
+        for value in values:
+            await sequence_writer.write(value)
+    assert writer.closed
+    assert b''.join(writer.chunks) == b''.join(dumps(value, shared_types={list})
+                                               for value in values)
+    assert len(writer.drained) > 1
+
+
+@pytest.mark.parametrize('value', [
+    0, 23, 24, 255, 256, 65535, 65536, 4294967295, 4294967296, (1 << 64) - 1, 1 << 64,
+    -1, -24, -25, -(1 << 64), -(1 << 64) - 1, 1 << 200, -(1 << 200),
+    '', 'a' * 23, 'a' * 24, '\u00e9' * 200, b'', b'x' * 300, bytearray(5),
+    1.5, 0.1, 1e300, math.nan, -math.inf, True, False, None,
+    [1, [2, [3]]], (1, 2), list(range(100)), {1: 2, 'a': [b'c'], (3, ): 4.5},
+    OrderedDict(a=1, b=2), {1, 2, 3}, frozenset(), array('h', range(10)), array('d'),
+    memoryview(b'abc'), Decimal('1.5'), CBORTag(99, [1, 2]), UUID(int=5),
+    datetime(2020, 1, 1, tzinfo=timezone.utc),
+])
+@pytest.mark.parametrize('kwargs', [
+    {}, {'float_style': CBORFloatStyle.DOUBLE}, {'sort_method': SortMethod.UNSORTED},
+])
+def test_encoded_size(value, kwargs):
+    assert CBOREncoder(**kwargs).encoded_size(value) == len(dumps(value, **kwargs))
+
+
+def test_encoded_size_shared():
+    shared = [1, 2]
+    value = [shared, {'a': shared, 'b': [shared]}]
+    encoder = CBOREncoder(shared_types={list, dict})
+    size = encoder.encoded_size(value)
+    assert encoder.encoded_size(value) == size
+    assert encoder.encode(value) == dumps(value, shared_types={list, dict})
+    assert size == len(dumps(value, shared_types={list, dict}))
+
+
+def test_encoded_size_recursive_fail():
+    value = []
+    value.append(value)
+    with pytest.raises(EncodingError):
+        CBOREncoder().encoded_size(value)
+
+
+@pytest.mark.parametrize('offset', [0, 3, 20])
+def test_encode_into(offset):
+    value = {'a': [1, b'xyz'], 'b': 'c' * 30}
+    encoding = dumps(value)
+    buffer = bytearray(b'\xff' * 100)
+    end = CBOREncoder().encode_into(value, buffer, offset)
+    assert end == offset + len(encoding)
+    assert buffer[offset: end] == encoding
+    assert buffer[:offset] == b'\xff' * offset
+    assert buffer[end:] == b'\xff' * (100 - end)
+
+
+def test_encode_into_mmap():
+    encoder = CBOREncoder()
+    values = [1, 'two', [3.5, None]]
+    with mmap.mmap(-1, 64) as mapping:
+        offset = 0
+        for value in values:
+            offset = encoder.encode_into(value, mapping, offset)
+        assert mapping[:offset] == b''.join(dumps(value) for value in values)
+
+
+def test_encode_into_typed_buffer():
+    buffer = array('I', [0] * 4)
+    assert CBOREncoder().encode_into('abc', buffer, 1) == 5
+    assert bytes(buffer)[:6] == b'\x00cabc\x00'
+
+
+@pytest.mark.parametrize('offset', [-1, 8, 10])
+def test_encode_into_does_not_fit(offset):
+    buffer = bytearray(10)
+    with pytest.raises(ValueError):
+        CBOREncoder().encode_into([1, 2], buffer, offset)
+    assert buffer == bytearray(10)
+
+
+def test_encode_into_read_only():
+    with pytest.raises(TypeError):
+        CBOREncoder().encode_into(1, b'\x00')
+
+
+@pytest.mark.parametrize('value, expected', [
+    (RawCBOR(b'\x01'), '01'),
+    ([RawCBOR(bytes.fromhex('a16161f6')), 2], '82a16161f602'),
+    ({'b': RawCBOR(b'\xff'), 'a': 1}, 'a26161016162ff'),
+    (EmbeddedCBOR(bytes.fromhex('6449455446')), 'd818456449455446'),
+    (EmbeddedCBOR(b''), 'd81840'),
+])
+def test_raw_cbor(value, expected):
+    assert dumps(value).hex() == expected
+    assert b''.join(CBOREncoder().iterencode(value)).hex() == expected
+    assert CBOREncoder().encoded_size(value) == len(expected) // 2
+
+
+def test_raw_cbor_round_trip():
+    document = {'header': {'id': 5}, 'body': [bytes(100), 'text'] * 10}
+    forwarded = {'id': 6, 'body': RawCBOR(dumps(document['body']), validate=True)}
+    assert loads(dumps(forwarded)) == {'id': 6, 'body': document['body']}
+
+
+def test_raw_cbor_segments():
+    raw = RawCBOR(dumps(bytes(20000)))
+    segments = CBOREncoder().encode_segments([1, raw], 10000)
+    assert segments[1] is raw.encoding
+    assert b''.join(segments) == dumps([1, raw])
+
+
+@pytest.mark.parametrize('sort_method', list(SortMethod))
+def test_memo_cache(sort_method):
+    config = FrozenDict({'b': FrozenOrderedDict([('z', 1), ('y', (1.5, None, b'x'))]),
+                         'a': frozenset({'p', 'q'}), 'c': (1, 2, 3)})
+    value = [{'id': n, 'config': config, 'copy': FrozenDict(config)} for n in range(10)]
+    encoder = CBOREncoder(sort_method=sort_method, memo_cache_bytes=1000)
+    expected = dumps(value, sort_method=sort_method)
+    assert encoder.encode(value) == expected
+    assert encoder.encode(value) == expected
+    assert b''.join(encoder.iterencode(value, 16)) == expected
+    assert encoder.encoded_size(value) == len(expected)
+    assert config in encoder._memo
+    assert encoder._memo_bytes == sum(len(encoding) for _value, encoding
+                                      in encoder._memo.values())
+
+
+@pytest.mark.parametrize('first, second', [
+    ((1, ), (True, )),
+    ((1, ), (1.0, )),
+    ((0.0, ), (-0.0, )),
+    ((1, (2, )), (1, (2.0, ))),
+    (frozenset({1, 2}), frozenset({True, 2})),
+    (frozenset({1.0}), frozenset({1})),
+    (FrozenDict({1: 'a'}), FrozenDict({1.0: 'a'})),
+    (FrozenDict({'a': 1}), FrozenDict({'a': True})),
+    (FrozenDict({'a': 1}), FrozenOrderedDict({'a': 1})),
+    (FrozenOrderedDict([('a', 1), ('b', 2)]), FrozenOrderedDict([('b', 2), ('a', 1)])),
+])
+@pytest.mark.parametrize('sort_method', [SortMethod.LEXICOGRAPHIC, SortMethod.UNSORTED])
+def test_memo_cache_strict(first, second, sort_method):
+    assert first == second
+    encoder = CBOREncoder(sort_method=sort_method, memo_cache_bytes=1000)
+    for value in (first, second, first, second):
+        assert encoder.encode(value) == dumps(value, sort_method=sort_method)
+
+
+def test_memo_cache_eviction():
+    encoder = CBOREncoder(memo_cache_bytes=100)
+    values = [(n, ) * 10 for n in range(24)]
+    for value in values:
+        assert encoder.encode(value) == dumps(value)
+        assert encoder._memo_bytes <= 100
+    assert list(encoder._memo) == values[-9:]
+    # Too large to cache
+    encoder.encode(tuple(range(200)))
+    assert list(encoder._memo) == values[-9:]
+    # Hits are most recently used
+    encoder.encode(values[-9])
+    encoder.encode(values[0])
+    assert list(encoder._memo) == values[-7:] + [values[-9], values[0]]
+
+
+class Mutable:
+    def __init__(self):
+        self.value = 1
+
+    def __encode_cbor__(self, encoder):
+        return encoder.encode_item(self.value)
+
+
+@pytest.mark.parametrize('kwargs', [
+    {'memo_cache_bytes': 1000},
+    {'memo_cache_bytes': 1000, 'shared_types': {list}},
+    {},
+])
+def test_memo_cache_mutable_members(kwargs):
+    encoder = CBOREncoder(**kwargs)
+    member = Mutable()
+    values = [(member, 2), FrozenDict({'a': member}), ([1], ), FrozenDict({'a': [1]})]
+    for value in values:
+        encoder.reset()
+        assert encoder.encode(value) == dumps(value, **kwargs)
+    member.value = [3]
+    values[2][0].append(4)
+    values[3]['a'].append(5)
+    for value in values:
+        encoder.reset()
+        assert encoder.encode(value) == dumps(value, **kwargs)
+    assert not encoder._memo
+
+
+def nested_list(depth):
+    value = []
+    for _ in range(depth):
+        value = [value]
+    return value
+
+
+@pytest.mark.parametrize('value', [
+    [1, -500, 1 << 70, b'foo', bytearray(b'bar'), 'baz', 1.5, True, None, list(range(30))],
+    {'b': [1, {2: 3}], 'a': (4, 5), 6: OrderedDict([(7, [8])]), (9, ): {10, 11}},
+    [{'id': n, 'name': str(n), 'tags': ['x', n]} for n in range(20)],
+    defaultdict(list, {'x': [CBORTag(99, {'y': [CBORTag(100, [])]})]}),
+    [namedtuple('nt', 'a b')(1, [2]), Counter(cats=3), FrozenDict(a=(1, 2))],
+    nested_list(50),
+])
+@pytest.mark.parametrize('kwargs', [
+    {}, {'sort_method': SortMethod.UNSORTED}, {'sort_method': SortMethod.LENGTH_FIRST},
+    {'shared_types': {list, dict, OrderedDict}}, {'key_cache_size': 10},
+    {'memo_cache_bytes': 1000}, {'float_style': CBORFloatStyle.DOUBLE},
+])
+def test_iterative_matches_recursive(value, kwargs):
+    expected = CBOREncoder(**kwargs).encode(value)
+    assert CBOREncoder(iterative=True, **kwargs).encode(value) == expected
+    assert b''.join(CBOREncoder(**kwargs).iterencode(value, 8)) == expected
+
+
+def test_iterative_shared_cycles():
+    a = [1]
+    b = {'a': a}
+    a.append(b)
+    value = [a, b, CBORTag(5, a)]
+    expected = CBOREncoder(shared_types={list, dict}).encode(value)
+    assert CBOREncoder(shared_types={list, dict}, iterative=True).encode(value) == expected
+
+
+@pytest.mark.parametrize('make, prefix, suffix', [
+    (lambda value: [value], b'\x81', b''),
+    (lambda value: {'a': value}, b'\xa1\x61a', b''),
+    (lambda value: OrderedDict(a=value), b'\xd9\x01\x10\xa1\x61a', b''),
+    (lambda value: CBORTag(6, value), b'\xc6', b''),
+    (lambda value: (1, value, 2), b'\x83\x01', b'\x02'),
+])
+@pytest.mark.parametrize('kwargs', [{}, {'memo_cache_bytes': 100}])
+def test_iterative_deep(make, prefix, suffix, kwargs):
+    depth = 20000
+    value = None
+    for _ in range(depth):
+        value = make(value)
+    expected = prefix * depth + b'\xf6' + suffix * depth
+    with pytest.raises(EncodingError):
+        CBOREncoder(**kwargs).encode(value)
+    assert CBOREncoder(iterative=True, **kwargs).encode(value) == expected
+    assert b''.join(CBOREncoder(**kwargs).iterencode(value)) == expected
+
+
+def cyclic_at(depth):
+    cycle = [1, 2]
+    cycle.append({'a': cycle})
+    value = cycle
+    for _ in range(depth):
+        value = [value]
+    return value
+
+
+@pytest.mark.parametrize('value', [
+    cyclic_at(0), cyclic_at(150), cyclic_at(5000),
+    CBORTag(1, cyclic_at(10)),
+])
+def test_iterative_cycles(value):
+    with pytest.raises(EncodingError, match='self-referential object detected'):
+        CBOREncoder(iterative=True).encode(value)
+    with pytest.raises(EncodingError, match='self-referential object detected'):
+        list(CBOREncoder().iterencode(value))
+
+
+def test_iterative_repeated_values():
+    # The same container may appear many times provided it is not within itself
+    inner = [1, [2]]
+    value = nested_list(300)
+    value[0].extend([inner] * 3)
+    expected = CBOREncoder().encode([value, inner, value])
+    assert CBOREncoder(iterative=True).encode([value, inner, value]) == expected
+
+
+class UpperEncoder(CBOREncoder):
+    def encode_text_string(self, value):
+        return super().encode_text_string(value.upper())
+
+
+class DoubleIntEncoder(CBOREncoder):
+    def encode_int(self, value, permit_bignum=True):
+        return super().encode_int(value * 2, permit_bignum)
+
+
+class ReversedDictEncoder(CBOREncoder):
+    def encode_dict(self, value):
+        return super().encode_dict(dict(reversed(value.items())))
+
+
+@pytest.mark.parametrize('cls', [UpperEncoder, DoubleIntEncoder, ReversedDictEncoder])
+@pytest.mark.parametrize('value', [
+    'abc',
+    [1, 2, 3, 4, 5, 6, 7, 8, 9, 'x'],
+    {'a': 1, 'b': [2, 'c'], 3: 'd'},
+    [{'k': n, 'v': str(n)} for n in range(5)],
+])
+def test_subclass_overrides(cls, value):
+    expected = cls().encode_item(value)
+    assert cls().encode(value) == expected
+    assert cls(iterative=True).encode(value) == expected
+    assert b''.join(cls().iterencode(value, 4)) == expected
+    assert cls().encoded_size(value) == len(expected)
+
+
+def test_dumps_resets_shared_state():
+    value = ['a long string'] * 2
+    first = dumps(value, shared_types={str})
+    assert dumps(value, shared_types={str}) == first
+
+
+@pytest.mark.parametrize('value', [
+    list(range(24)) * 3,
+    tuple(range(20)),
+    list(range(25)),
+    [1] * 10 + [-1],
+    [1] * 10 + [True],
+    [True] * 10,
+    [0.5, 1.5, -2.0, 0.0, -0.0, math.inf, -math.inf, 65504.0] * 2,
+    [0.1 * n for n in range(1, 20)],
+    [0.1 * n for n in range(1, 20)] + [1.5],
+    [0.1] * 8 + [math.nan],
+    [1.5] * 8 + [math.nan],
+    [1.0e300, -1.0e300, 0.1] * 3,
+    [3.4028234663852886e+38, 1.1754943508222875e-38, 0.1] * 3,
+    [1.5] * 10 + [1],
+])
+@pytest.mark.parametrize('float_style', list(CBORFloatStyle))
+def test_bulk_lists(value, float_style):
+    encoder = CBOREncoder(float_style=float_style)
+    expected = pack_cbor_length(len(value), 0x80)
+    expected += b''.join(encoder.encode_item(item) for item in value)
+    assert encoder.encode(value) == expected
+    assert b''.join(encoder.iterencode([value], chunk_size=4)) == b'\x81' + expected
+    result = loads(expected)
+    assert len(result) == len(value)
+    assert all(a == b or a != a and b != b for a, b in zip(result, value))
+
+
+def test_bulk_list_shared_types():
+    value = [1] * 10
+    encoding = bytes.fromhex('d81c82d81c8a') + bytes(value) + bytes.fromhex('d81d01')
+    assert dumps([value, value], shared_types={list}) == encoding
+    assert dumps([1.5] * 10, shared_types={float})[:4] == bytes.fromhex('8ad81cf9')
+
+
+@pytest.mark.parametrize('sort_method', list(SortMethod))
+def test_key_cache(sort_method):
+    records = [{'name': n, 1: 'one', True: 'true', b'raw': None, (1, 2): n, 1.5: 'x'}
+               for n in range(50)]
+    expected = dumps(records, sort_method=sort_method)
+    encoder = CBOREncoder(sort_method=sort_method, key_cache_size=3)
+    assert encoder.encode(records) == expected
+    assert b''.join(encoder.iterencode(records, chunk_size=64)) == expected
+    info = encoder._key_cache.cache_info()
+    assert info.currsize == 3 and info.hits > 100
+
+
+def test_key_cache_shared_types():
+    key = 'key'
+    value = [{key: 1}, {key: 2}]
+    encoder = CBOREncoder(shared_types={str}, key_cache_size=10)
+    assert encoder.encode(value) == dumps(value, shared_types={str})
+    assert encoder._key_cache.cache_info().currsize == 0
+
+
+@pytest.mark.parametrize('sort_method', list(SortMethod))
+def test_record_template(sort_method):
+    keys = ['bb', 'a', 1, b'c', 'ccc', (1, 2)]
+    template = RecordTemplate(keys, sort_method)
+    record = {key: n for n, key in enumerate(keys)}
+    encoder = CBOREncoder(sort_method=sort_method)
+    expected = dumps(record, sort_method=sort_method)
+    assert template.encode(record, encoder) == expected
+    assert template.keys_size == len(expected) - len(keys)
+    assert template.write(record, encoder) is None
+    assert bytes(encoder._out) == expected
+    with pytest.raises(ValueError):
+        template.encode({**record, 'd': 1}, encoder)
+    with pytest.raises(KeyError):
+        template.encode({('d' if key == 'a' else key): 1 for key in keys}, encoder)
+
+
+@pytest.mark.parametrize('keys', [[], ['a'], ['a', 1.0, 1]])
+def test_record_template_small(keys):
+    record = dict.fromkeys(keys)
+    if len(record) != len(keys):
+        with pytest.raises(ValueError):
+            RecordTemplate(keys)
+    else:
+        assert RecordTemplate(keys).encode(record, CBOREncoder()) == dumps(record)
+
+
+@pytest.mark.parametrize('sort_method', list(SortMethod))
+def test_automatic_templates(sort_method):
+    records = [{'name': str(n), 'id': n, 'nested': {'id': n, 'name': 'x'}} for n in range(100)]
+    records.append({'name': 1, 1: 'name'})
+    records.append({'name': 1, (1, ): 'name'})
+    records.append({'x' + str(n): n for n in range(40)})
+    records.append(OrderedDict(b=1, a=2))
+    records.append({'id': 1, 'name': 'reordered', 'nested': {}})
+    encoder = CBOREncoder(sort_method=sort_method)
+    encoding = encoder.encode(records)
+    # Not for non-scalar keys, too many keys, or OrderedDicts
+    assert len(encoder._templates) == 4
+    assert encoder.encode_item(records) == encoding
+    assert b''.join(encoder.iterencode(records, chunk_size=100)) == encoding
+    # Compare with encoding without templates
+    plain = CBOREncoder(sort_method=sort_method)
+    plain._template = lambda value: None
+    assert plain.encode(records) == encoding
+    assert not plain._templates
+
+
+def test_automatic_templates_shared_str():
+    records = [{'a': 1}, {'a': 2}]
+    encoder = CBOREncoder(shared_types={str})
+    assert encoder.encode(records).count(bytes.fromhex('d81c')) == 1
+    assert not encoder._templates
+
+
+@pytest.mark.parametrize('sort_method', list(SortMethod))
+@pytest.mark.parametrize('float_style', list(CBORFloatStyle))
+def test_automatic_templates_scalar_keys(sort_method, float_style):
+    records = [{1: 'a', 'b': 2, -5: None, b'x': 1.5, 2.5: [], None: 0, False: 1}] * 3
+    records += [{1: 'x'}, {True: 'x'}, {1.0: 'x'}, {1: 'x'}, {-1: 'x', None: 'x'}] * 2
+    encoder = CBOREncoder(sort_method=sort_method, float_style=float_style)
+    encoding = encoder.encode(records)
+    plain = CBOREncoder(sort_method=sort_method, float_style=float_style)
+    plain._template = lambda value: None
+    assert plain.encode(records) == encoding
+    assert loads(encoding) == records
+    # Dicts with float keys get no template
+    assert len(encoder._templates) == 2
+
+
+@pytest.mark.parametrize('keys', [(0.0, -0.0), (-0.0, 0.0), (1.0, 1, True), (True, 1.0)])
+def test_automatic_templates_equal_keys(keys):
+    records = [{key: 1} for key in keys]
+    expected = b''.join(CBOREncoder().encode(record) for record in records)
+    encoder = CBOREncoder()
+    assert encoder.encode(records)[1:] == expected
+    assert b''.join(dumps(record) for record in records) == expected
+    assert b''.join(CBOREncoder().iterencode(records))[1:] == expected
+
+
+def test_zero_keys():
+    assert dumps({0.0: 1}).hex() == 'a1f9000001'
+    assert dumps({-0.0: 1}).hex() == 'a1f9800001'
+    assert CBOREncoder().encode([{0.0: 1}, {-0.0: 1}]).hex() == '82a1f9000001a1f9800001'
+
+
+class SameEncoding:
+    '''Distinct keys with the same encoding that cannot be compared.'''
+
+    def __init__(self, n):
+        self.n = n
+
+    def __encode_cbor__(self, encoder):
+        return b'\x00'
+
+
+def test_sorting_compares_only_encoded_keys():
+    value = {SameEncoding(1): SameEncoding(1), SameEncoding(2): SameEncoding(2)}
+    assert dumps(value, deterministic=True) == bytes.fromhex('a200000000')
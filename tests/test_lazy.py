@@ -0,0 +1,77 @@
+from collections import OrderedDict
+
+import pytest
+
+from cborx import *
+
+
+document = {
+    'records': [{'id': n, 'payload': bytes([n]) * n, 'tags': ['a', 'b'][:n % 3]}
+                for n in range(20)],
+    'meta': {'version': 2, 'ordered': OrderedDict(b=1, a=2), 'set': {1, 2}},
+    (1, 2): 'tuple key',
+    'float': 1.5,
+}
+
+
+def test_lazy_map():
+    view = loads_lazy(dumps(document))
+    assert isinstance(view, LazyMap)
+    assert len(view) == 4
+    assert 'meta' in view and (1, 2) in view and 'other' not in view
+    assert set(view) == set(document)
+    records = view['records']
+    assert isinstance(records, LazyArray)
+    assert len(records) == 20
+    assert records[17]['payload'] == bytes([17]) * 17
+    assert records[-1]['id'] == 19
+    assert records[17] is records[17]
+    assert view[(1, 2)] == 'tuple key'
+    assert view['meta']['ordered'] == OrderedDict(b=1, a=2)
+    assert view == document
+
+
+def test_lazy_materialize():
+    encoding = dumps(document)
+    view = loads_lazy(encoding)
+    assert view.materialize() == loads(encoding)
+    assert view['records'].materialize() == loads(encoding)['records']
+    assert isinstance(view['meta'].materialize(), dict)
+
+
+def test_lazy_state_after_error():
+    # The tag 272 on the first member is invalid; its flag must not leak into the second
+    view = loads_lazy(bytes.fromhex('82d9011001a1616101'))
+    with pytest.raises(TagError):
+        view[0]
+    value = view[1].materialize()
+    assert value == {'a': 1} and not isinstance(value, OrderedDict)
+
+
+@pytest.mark.parametrize("encoding, expected", [
+    ('9f018202039f0405ffff', [1, [2, 3], [4, 5]]),
+    ('bf61610161629f0203ffff', {'a': 1, 'b': [2, 3]}),
+    ('83019f0203ff820405', [1, [2, 3], [4, 5]]),
+    ('1903e8', 1000),
+])
+def test_lazy_indefinite_length(encoding, expected):
+    assert loads_lazy(bytes.fromhex(encoding)) == expected
+
+
+def test_lazy_slice():
+    view = loads_lazy(dumps(list(range(30))))
+    assert view[5:25:5] == [5, 10, 15, 20]
+
+
+def test_lazy_duplicate_keys():
+    view = loads_lazy(bytes.fromhex('a201020102'))
+    with pytest.raises(DuplicateKeyError):
+        len(view)
+
+
+def test_lazy_check_eof():
+    loads_lazy(bytes.fromhex('820102ff'))
+    with pytest.raises(UnconsumedDataError):
+        loads_lazy(bytes.fromhex('820102ff'), check_eof=True)
+    with pytest.raises(UnexpectedEOFError):
+        loads_lazy(b'')
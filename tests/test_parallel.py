@@ -0,0 +1,96 @@
+from collections import OrderedDict
+
+import pytest
+
+from cborx import *
+from cborx.parallel import item_ranges
+
+
+records = [{'id': n, 'name': f'record {n}', 'data': bytes(n % 50)} for n in range(500)]
+
+
+@pytest.fixture
+def sequence_path(tmp_path):
+    path = tmp_path / 'seq.cbor'
+    path.write_bytes(b''.join(dumps(record) for record in records))
+    return path
+
+
+@pytest.mark.parametrize("workers", [1, 2, 3])
+def test_load_sequence_parallel(sequence_path, workers):
+    result = load_sequence_parallel(sequence_path, workers=workers, range_size=1000)
+    assert list(result) == records
+
+
+def test_load_sequence_parallel_kwargs(sequence_path):
+    result = load_sequence_parallel(sequence_path, workers=2, range_size=500,
+                                    string_errors='replace')
+    assert list(result) == records
+
+
+def test_load_sequence_parallel_early_exit(sequence_path):
+    result = load_sequence_parallel(sequence_path, workers=2, range_size=100)
+    assert next(result) == records[0]
+    result.close()
+
+
+def test_load_sequence_parallel_empty(tmp_path):
+    path = tmp_path / 'empty.cbor'
+    path.write_bytes(b'')
+    assert list(load_sequence_parallel(path, workers=2)) == []
+
+
+def test_load_sequence_parallel_truncated(sequence_path):
+    with open(sequence_path, 'ab') as f:
+        f.write(dumps(records[0])[:-1])
+    result = load_sequence_parallel(sequence_path, workers=2, range_size=1000)
+    assert [next(result) for _ in records] == records
+    with pytest.raises(UnexpectedEOFError):
+        next(result)
+
+
+@pytest.mark.parametrize("range_size", [1, 10, 100, 1 << 20])
+def test_item_ranges(range_size):
+    raw = b''.join(dumps(record) for record in records)
+    ranges = list(item_ranges(raw, range_size))
+    assert ranges[0][0] == 0 and ranges[-1][1] == len(raw)
+    assert all(a[1] == b[0] for a, b in zip(ranges, ranges[1:]))
+    assert [item for start, end in ranges
+            for item in loads_sequence(raw[start:end])] == records
+
+
+big_list = [{'id': n, 'name': f'item {n}', 'values': [n, n * 0.5]} for n in range(3000)]
+big_dict = {(f'key {n}' if n % 3 else n): [n, str(n)] for n in range(3000)}
+
+
+@pytest.mark.parametrize("value", [
+    big_list,
+    tuple(big_list),
+    list(range(3000)),
+    big_dict,
+    FrozenDict(big_dict),
+    OrderedDict(reversed(list(big_dict.items()))),
+])
+@pytest.mark.parametrize("kwargs", [
+    {},
+    {'sort_method': SortMethod.LENGTH_FIRST},
+    {'sort_method': SortMethod.UNSORTED},
+    {'deterministic': True, 'float_style': CBORFloatStyle.DOUBLE},
+])
+def test_dumps_parallel(value, kwargs):
+    assert dumps_parallel(value, workers=2, chunk_length=700, **kwargs) == dumps(value, **kwargs)
+
+
+@pytest.mark.parametrize("value, kwargs", [
+    (big_list, {'shared_types': {dict}}),
+    (big_list[:10], {}),
+    ('string', {}),
+    (CBORTag(1, big_list), {}),
+])
+def test_dumps_parallel_fallback(value, kwargs):
+    assert dumps_parallel(value, workers=2, chunk_length=700, **kwargs) == dumps(value, **kwargs)
+
+
+def test_dumps_parallel_error():
+    with pytest.raises(EncodingError):
+        dumps_parallel([1] * 2000 + [dumps_parallel], workers=2, chunk_length=700)
@@ -0,0 +1,86 @@
+import pytest
+
+from cborx import *
+from cborx.sequence_file import index_path, main
+
+
+records = [n if n % 3 else {'id': n, 'data': bytes(n)} for n in range(100)]
+
+
+def write_sequence(path, items, mode='wb'):
+    with open(path, mode) as f:
+        for item in items:
+            f.write(dumps(item))
+
+
+def test_sequence_file(tmp_path):
+    path = tmp_path / 'seq.cbor'
+    write_sequence(path, records)
+    with SequenceFile(path) as seq:
+        assert len(seq) == len(records)
+        assert seq[0] == records[0]
+        assert seq[57] == records[57]
+        assert seq[-1] == records[-1]
+        assert seq[10:20:3] == records[10:20:3]
+        assert list(seq) == records
+        with pytest.raises(IndexError):
+            seq[len(records)]
+    assert (tmp_path / 'seq.cbor.idx').exists()
+
+
+def test_scan_offsets():
+    raw = b''.join(dumps(item) for item in [1, 2, 3, 4, 5])
+    offsets, end = scan_offsets(raw)
+    assert list(offsets) == [0, 1, 2, 3, 4]
+    assert end == 5
+    # A truncated final item is not indexed
+    offsets, end = scan_offsets(raw + dumps(records[6])[:-1])
+    assert len(offsets) == 5 and end == 5
+    assert scan_offsets(b'') == (offsets[:0], 0)
+
+
+def test_update_index_append(tmp_path):
+    path = tmp_path / 'seq.cbor'
+    write_sequence(path, records[:40])
+    assert len(update_index(path)) == 40
+    # Append a complete and a partial record
+    write_sequence(path, records[40:70], 'ab')
+    with open(path, 'ab') as f:
+        f.write(dumps(records[70])[:-1])
+    size = (tmp_path / 'seq.cbor.idx').stat().st_size
+    with SequenceFile(path) as seq:
+        assert len(seq) == 70
+        assert (tmp_path / 'seq.cbor.idx').stat().st_size == size + 30 * 8
+        with open(path, 'ab') as f:
+            f.write(dumps(records[70])[-1:])
+        write_sequence(path, records[71:], 'ab')
+        seq.refresh()
+        assert list(seq) == records
+    assert list(update_index(path)) == list(scan_offsets(path.read_bytes())[0])
+
+
+def test_update_index_rebuild(tmp_path):
+    path = tmp_path / 'seq.cbor'
+    write_sequence(path, records)
+    update_index(path)
+    # Truncation causes a rebuild, as does a corrupt index
+    write_sequence(path, records[:10])
+    assert len(update_index(path)) == 10
+    with open(index_path(path), 'wb') as f:
+        f.write(b'garbage')
+    assert len(update_index(path)) == 10
+
+
+def test_sequence_file_empty(tmp_path):
+    path = tmp_path / 'empty.cbor'
+    path.write_bytes(b'')
+    with SequenceFile(path) as seq:
+        assert len(seq) == 0
+        assert list(seq) == []
+
+
+def test_main(tmp_path, capsys):
+    path = tmp_path / 'seq.cbor'
+    write_sequence(path, records)
+    main([str(path)])
+    assert '100 items indexed' in capsys.readouterr().out
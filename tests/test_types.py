@@ -173,3 +173,46 @@ def test_CBORSimple():
 def test_simple_equality():
     assert CBORSimple(0) == CBORSimple(0)
     assert CBORSimple(0) != CBORSimple(1)
+
+
+def test_RawCBOR():
+    raw = RawCBOR(bytearray(b'\x82\x01\x02'), validate=True)
+    assert raw.encoding == b'\x82\x01\x02'
+    assert raw.decode() == [1, 2]
+    assert raw == RawCBOR(b'\x82\x01\x02')
+    assert raw != EmbeddedCBOR(b'\x82\x01\x02')
+    assert hash(raw) == hash(b'\x82\x01\x02')
+    assert repr(raw) == "RawCBOR(b'\\x82\\x01\\x02')"
+    # Not validated by default
+    assert RawCBOR(b'\xff').encoding == b'\xff'
+
+
+@pytest.mark.parametrize('encoding, exception', [
+    ('', UnexpectedEOFError),
+    ('8201', UnexpectedEOFError),
+    ('0102', UnconsumedDataError),
+    ('ff', MisplacedBreakError),
+    ('1c', BadInitialByteError),
+])
+@pytest.mark.parametrize('cls', [RawCBOR, EmbeddedCBOR])
+def test_RawCBOR_validate(cls, encoding, exception):
+    with pytest.raises(exception):
+        cls(bytes.fromhex(encoding), validate=True)
+
+
+def test_EmbeddedCBOR():
+    embedded = EmbeddedCBOR(b'\xa1\x61a\x80', validate=True)
+    assert embedded._value is not embedded.encoding
+    value = embedded.value
+    assert value == {'a': []}
+    assert embedded.value is value
+    assert embedded.decode(retain_bignums=True) == value
+    assert repr(embedded) == "EmbeddedCBOR(b'\\xa1aa\\x80')"
+
+
+class RawSubclass(RawCBOR):
+    pass
+
+
+def test_RawCBOR_subclass():
+    assert dumps([RawSubclass(b'\x01'), RawCBOR(b'\x02')]) == b'\x82\x01\x02'
@@ -1,8 +1,11 @@
 from datetime import datetime, timezone, timedelta
+import sys
 
 import pytest
 
-from cborx.util import datetime_from_enhanced_RFC3339_text as text_to_datetime
+from cborx.util import (
+    datetime_from_enhanced_RFC3339_text as text_to_datetime, buffer_format_to_tag, CodecPool,
+)
 
 
 def tz(seconds):
@@ -48,3 +51,50 @@ def test_text_to_datetime(text, expected):
 def test_bad_text_to_datetime(text):
     with pytest.raises(ValueError):
         text_to_datetime(text)
+
+
+class Resettable:
+
+    def __init__(self, *args, **kwargs):
+        self.args = args
+        self.kwargs = kwargs
+
+    def reset(self, *args):
+        self.args = args
+
+
+def test_codec_pool_reuse():
+    pool = CodecPool(Resettable)
+    key, first = pool.acquire((1, ), {'shared_types': {list}, 'tag_decoders': {1: 2}})
+    assert first.args == (1, )
+    assert first.kwargs == {'shared_types': frozenset({list}), 'tag_decoders': {1: 2}}
+    # In use so not handed out again
+    key2, second = pool.acquire((2, ), {'tag_decoders': {1: 2}, 'shared_types': frozenset([list])})
+    assert key2 == key and second is not first
+    pool.release(key, first)
+    assert first.args == ()
+    key3, third = pool.acquire((3, ), {'shared_types': {list}, 'tag_decoders': {1: 2}})
+    assert third is first and third.args == (3, )
+
+
+def test_codec_pool_unhashable():
+    pool = CodecPool(Resettable)
+    key, first = pool.acquire((), {'option': {'a': []}})
+    assert key is None
+    pool.release(key, first)
+    assert pool.acquire((), {'option': {'a': []}})[1] is not first
+
+
+@pytest.mark.parametrize('fmt, tag', [
+    ('B', 64), ('<B', 64), ('b', 72), ('>H', 65), ('<H', 69), ('!h', 73), ('<i', 78),
+    ('>Q', 67), ('<q', 79), ('>e', 80), ('<e', 84), ('>f', 81), ('<d', 86),
+    ('?', None), ('c', None), ('2d', None), ('<', None), ('T{d}', None),
+])
+def test_buffer_format_to_tag(fmt, tag):
+    assert buffer_format_to_tag(fmt) == tag
+
+
+def test_buffer_format_to_tag_native():
+    is_le = sys.byteorder == 'little'
+    assert buffer_format_to_tag('d') == buffer_format_to_tag('<d' if is_le else '>d')
+    assert buffer_format_to_tag('=h') == buffer_format_to_tag('<h' if is_le else '>h')